@@ -0,0 +1,134 @@
+"""
+Background worker for the estimation queue.
+
+The worker claims queued estimation jobs and runs them in a pool of processes, so estimations keep running when the
+Streamlit page is refreshed, and several users can estimate at the same time. The app starts a worker automatically
+when none is alive, but you can also run it yourself from the `/app/` directory:
+
+    python estimation_worker.py
+
+The number of processes is set with the `ESTIMATION_WORKERS` environment variable (default: 2).
+A worker started by the app writes its output to `/app/data/estimation_worker.log`.
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from util.estimation_jobs import (
+    claim_next_job,
+    update_job_progress,
+    finish_job,
+    requeue_interrupted_jobs,
+    record_worker_heartbeat,
+    claim_worker_role,
+)
+
+
+POLL_INTERVAL = 1
+
+
+def run_job(job):
+    """
+    Runs the estimation pipeline for a job and records its result. Runs in a process of the pool.
+
+    Args:
+        job (dict): The claimed job.
+
+    Returns:
+        None
+    """
+    # Imported here so the pipeline (and Streamlit) is only loaded in the pool processes
+    from util.estimation_pipeline import run_estimation_pipeline
+
+    def report_progress(stage, **partial_results):
+        update_job_progress(job["id"], stage, **partial_results)
+
+    try:
+        result = run_estimation_pipeline(job["payload"], report_progress)
+        finish_job(job["id"], result=result)
+    except Exception as e:
+        finish_job(job["id"], error=str(e))
+
+
+def run_worker(max_workers):
+    """
+    Claims queued jobs and runs them, with at most `max_workers` jobs at the same time.
+
+    Args:
+        max_workers (int): The number of worker processes.
+
+    Returns:
+        None
+    """
+    # Only requeue interrupted jobs once this process is the only worker, or it would requeue the jobs of a live one
+    if not claim_worker_role(os.getpid()):
+        print("Another estimation worker is already running.")
+        return
+
+    requeued = requeue_interrupted_jobs()
+    if requeued:
+        print(f"Queued {requeued} interrupted job(s) again.")
+
+    running = {}  # Future -> job ID
+    # Jobs that were in flight when a pool process died. They run one at a time until they finish,
+    # so a job that crashes the pool again is known to be the cause, and the other jobs are not failed with it.
+    suspects = []
+    pool = ProcessPoolExecutor(max_workers=max_workers)
+    try:
+        while True:
+            record_worker_heartbeat(os.getpid())
+
+            crashed = []
+            for future in [future for future in running if future.done()]:
+                job_id = running.pop(future)
+                if job_id in suspects:
+                    suspects.remove(job_id)
+                # run_job records its own errors, so an exception here means the job could not run in the pool
+                if isinstance(future.exception(), BrokenProcessPool):
+                    crashed.append(job_id)
+                elif future.exception() is not None:
+                    print(f"Job {job_id} failed: {future.exception()!r}")
+                    finish_job(job_id, error=f"The job could not be run: {future.exception()!r}")
+
+            if crashed:
+                # Every job in flight is interrupted when a pool process dies
+                crashed.extend(running.values())
+                running.clear()
+                pool.shutdown(wait=False)
+                pool = ProcessPoolExecutor(max_workers=max_workers)
+
+                if len(crashed) == 1:
+                    print(f"Job {crashed[0]} stopped its worker process.")
+                    finish_job(crashed[0], error="The worker process stopped unexpectedly while running this job.")
+                else:
+                    print(f"A worker process stopped, queued {len(crashed)} interrupted job(s) again.")
+                    requeue_interrupted_jobs(crashed)
+                    suspects.extend(job_id for job_id in crashed if job_id not in suspects)
+
+            while len(running) < max_workers:
+                if suspects:
+                    if running:
+                        break
+                    job = claim_next_job(suspects[0])
+                    if job is None:
+                        suspects.pop(0)
+                        continue
+                    print(f"Running job {job['id']} on its own")
+                    running[pool.submit(run_job, job)] = job["id"]
+                    break
+
+                job = claim_next_job()
+                if job is None:
+                    break
+                print(f"Running job {job['id']}")
+                running[pool.submit(run_job, job)] = job["id"]
+
+            time.sleep(POLL_INTERVAL)
+    finally:
+        pool.shutdown(wait=False)
+
+
+if __name__ == "__main__":
+    run_worker(int(os.getenv("ESTIMATION_WORKERS") or 2))
@@ -1,474 +1,256 @@
 import os
 import time
-import requests
 import pandas as pd
 import streamlit as st
-from azure.storage.blob import BlobServiceClient, ContentSettings
-from util.query_roles_and_rates_from_db import fetch_roles_and_rates
+from util.estimation_pricing import estimation_totals
+from util.estimation_pipeline import upload_pdf_to_azure, count_pdf_pages
+from util.estimation_jobs import submit_job, get_job, ensure_worker_running
+from util.estimation_store import (
+    compute_file_hash,
+    fetch_estimations,
+    load_estimation,
+    find_estimation_by_pdf_hash,
+)
+from util.profiling import start_profiling, stop_profiling
 import io
 import json
 
-#region PDF Upload and Analysis
-def upload_pdf_to_azure(uploaded_file):
+#region Estimation Display
+def display_estimation(tasks, key_prefix="estimation"):
     """
-    Uploads a PDF file to an Azure Blob Storage container.
+    Displays the project estimation in a Streamlit app.
+    This function performs the following tasks:
+    1. Displays the project estimation title.
+    2. Displays the tasks in a DataFrame format.
+    3. Provides download options for the estimation as an Excel file and JSON file.
+    4. Exports profiles to a JSON file and provides a download button.
+    Args:
+        tasks (list): The estimated tasks.
+        key_prefix (str): Prefix for the widget keys, so the estimation can be displayed more than once on a page.
     """
-    try:
-        blob_service_client = BlobServiceClient.from_connection_string(
-            st.secrets["AZURE_STORAGE_CONNECTION_STRING"]
+    # Display title for project estimation
+    st.write(f"### Estimated Project")
+
+    # Display tasks as a DataFrame
+    df = pd.DataFrame(tasks)
+    st.dataframe(df)
+
+    # Display the project totals
+    if "EstimatedPrice" in df.columns:
+        totals = estimation_totals(df)
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Estimated Days", f"{totals['EstimatedDays']:g}")
+        col2.metric("Estimated Price", f"{totals['EstimatedPrice']:,.2f}")
+        col3.metric("Price incl. Contingency", f"{totals['TotalPrice']:,.2f}")
+    if "Issues" in df.columns and df["Issues"].astype(bool).any():
+        st.warning("Some tasks have an unknown Profile or a Module that does not match their Profile, see the Issues column.")
+
+    # Generate Excel download option
+    excel_buffer = io.BytesIO()
+    with pd.ExcelWriter(excel_buffer, engine="openpyxl") as writer:
+        df.to_excel(writer, index=False, sheet_name="Project Estimation")
+    excel_buffer.seek(0)
+
+    # Generate JSON download option
+    json_data = json.dumps(tasks, indent=4)  # Convert tasks to formatted JSON
+
+
+    ### DOWNLOAD BUTTONS
+    col1, col2 = st.columns(2)
+    with col1:
+        st.download_button(
+            label="Download Estimation as Excel",
+            data=excel_buffer,
+            file_name="project_estimation.xlsx",
+            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            key=f"{key_prefix}_excel",
         )
-
-        container_client = blob_service_client.get_container_client(
-            st.secrets["AZURE_CONTAINER_NAME"]
-        )
-
-        if not container_client.exists():
-            container_client.create_container()
-
-        blob_name = uploaded_file.name
-        blob_client = container_client.get_blob_client(blob_name)
-
-        blob_client.upload_blob(
-            uploaded_file,
-            overwrite=True,
-            content_settings=ContentSettings(content_type="application/pdf"),
+    with col2:
+        st.download_button(
+            label="Download Estimation as JSON",
+            data=json_data,
+            file_name="project_estimation.json",
+            mime="application/json",
+            key=f"{key_prefix}_json",
         )
 
-        blob_url = f"https://{st.secrets['AZURE_STORAGE_ACCOUNT_NAME']}.blob.core.windows.net/{st.secrets['AZURE_CONTAINER_NAME']}/{blob_name}"
-        
-        st.success(f"Upload successful. File URL: {blob_url}")
-        return blob_url
-
-    except Exception as e:
-        st.error(f"An error occurred during upload: {str(e)}")
-        return None
-
-def analyze_pdf(pdf_path_or_url, is_url=False):
-    """
-    Analyzes a PDF document using the Azure Form Recognizer service.
-    """
-    analyze_url = f"{st.secrets['DOC_INTEL_ENDPOINT']}/formrecognizer/documentModels/prebuilt-read:analyze?api-version=2023-07-31"
-    headers = {
-        "Content-Type": "application/json" if is_url else "application/octet-stream",
-        "Ocp-Apim-Subscription-Key": st.secrets["DOC_INTEL_API_KEY"],
-    }
-
-    try:
-        if is_url:
-            data = {"urlSource": pdf_path_or_url}
-            response = requests.post(analyze_url, headers=headers, json=data)
-        else:
-            response = requests.post(
-                analyze_url, headers=headers, data=pdf_path_or_url.read()
-            )
-
-        if response.status_code == 202:
-            operation_location = response.headers["Operation-Location"]
-            while True:
-                result_response = requests.get(
-                    operation_location,
-                    headers={
-                        "Ocp-Apim-Subscription-Key": st.secrets["DOC_INTEL_API_KEY"]
-                    },
-                )
-                result_json = result_response.json()
-
-                if result_json["status"] in ["succeeded", "failed"]:
-                    break
-                time.sleep(1)
-
-            if result_json["status"] == "succeeded":
-                if (
-                    "analyzeResult" in result_json
-                    and "content" in result_json["analyzeResult"]
-                ):
-                    return result_json["analyzeResult"]["content"]
-                else:
-                    st.warning("No content found in the analysis response.")
-                    return None
-        else:
-            st.error(f"Error in initiating analysis: {response.json()}")
-            return None
-    except Exception as e:
-        st.error(f"An error occurred during PDF analysis: {str(e)}")
-        return None
-#endregion
-
-#region AI Search and Task Estimation
-def generate_search_query(user_prompt, pdf_content=None):
-    """
-    Generates a search query based on the user prompt and optional PDF content.
-    """
-    openai_prompt = f"""
-    Context:
-    You are helping to create a project timeline. The user has provided details and additional requirements.
-
-    PDF Content:
-    {pdf_content if pdf_content else "No PDF content provided."}
-
-    Additional User Requirements:
-    {user_prompt}
-
-    Instructions:
-    - Write a query to search for tasks relevant to the described project.
-    - The query should focus on finding tasks with clear roles, responsibilities, or descriptions relevant to the project.
-    - Consider both the PDF content (if available) and additional requirements when forming the query.
-    - Aim for tasks that are high-priority or foundational to the type of project described.
-    - Keep the query concise but descriptive enough to retrieve meaningful results.
-
-    Query:
-    """
-
-    headers = {
-        "Content-Type": "application/json",
-        "api-key": st.secrets["OPENAI_API_KEY"],
-    }
-    data = {
-        "messages": [{"role": "user", "content": openai_prompt}],
-        "max_tokens": 150,
-        "temperature": 0.7,
-    }
 
-    try:
-        response = requests.post(
-            st.secrets["OPENAI_ENDPOINT"], headers=headers, json=data
-        )
-        if response.status_code == 200:
-            return response.json()["choices"][0]["message"]["content"].strip()
-        else:
-            st.error(f"Error in OpenAI query generation: {response.text}")
-            return None
-    except Exception as e:
-        st.error(f"An error occurred during query generation: {str(e)}")
-        return None
+    # Export profiles to JSON
+    profile_data = df["Profile"].to_json(index=False).encode("utf-8")
+    st.download_button(
+        label="profiles.json",
+        data=profile_data,
+        file_name="profiles.json",
+        mime="application/json",
+        key=f"{key_prefix}_profiles",
+    )
 
-def query_azure_ai_search(generated_query):
+def submit_estimation(payload, job_key, force=False):
     """
-    Queries the Azure AI Search service with a generated query.
+    Submits an estimation job to the background queue and remembers its ID in the session state.
     Args:
-        generated_query (str): The query string to search for.
-    Returns:
-        list: A list of search results if the query is successful.
-        None: If there is an error in querying the Azure AI Search service.
-    Raises:
-        Exception: If there is an error while making the request to the Azure AI Search service.
+        payload (dict): The job input, see `run_estimation_pipeline`.
+        job_key (str): The session state key under which the job ID is stored.
+        force (bool): Queue a new job even if the same input is still queued or running.
     """
-    headers = {
-        "Content-Type": "application/json",
-        "api-key": st.secrets["AZURE_SEARCH_API_KEY"],
-    }
-    
-    search_url = f"{st.secrets['AZURE_SEARCH_ENDPOINT']}/indexes/{st.secrets['AZURE_SEARCH_INDEX_NAME']}/docs/search?api-version=2021-04-30-Preview"
-
-    search_data = {
-        "search": generated_query,
-        "top": 5,
-    }
-
-    try:
-        response = requests.post(search_url, headers=headers, json=search_data)
-        if response.status_code == 200:
-            search_results = response.json()
-            return search_results['value']
-        else:
-            st.error(f"Error querying AI Search: {response.status_code} - {response.text}")
-            return None
-    except Exception as e:
-        st.error(f"Error while querying Azure AI Search: {str(e)}")
-        return None
+    st.session_state[job_key] = submit_job(payload, force=force)
+    # Also keep the job ID in the URL, so a browser refresh does not lose track of the job
+    st.query_params[job_key] = st.session_state[job_key]
+    ensure_worker_running()
 
-def construct_estimation_prompt(search_results, user_prompt):
+def display_estimation_job(job_key, key_prefix="estimation"):
     """
-    Constructs a detailed project estimation prompt based on search results and user input.
+    Displays the status, partial results or result of the estimation job stored under `job_key`.
     Args:
-        search_results (list): A list of dictionaries containing task details retrieved from a search.
-        user_prompt (str): The user's project description.
+        job_key (str): The session state key under which the job ID is stored.
+        key_prefix (str): Prefix for the widget keys of the displayed estimation.
     Returns:
-        str: A formatted string containing the project estimation prompt, including context, instructions, and task details.
-    The function performs the following steps:
-        1. Formats the search results into a structured string with task details.
-        2. Displays the top 5 suggested tasks in a collapsible section using Streamlit.
-        3. Constructs a detailed project estimation prompt with guidelines for creating new estimated tasks, including:
-            - Timeline for task completion.
-            - Identification of risks, delays, or dependencies.
-            - Estimated price and required resources or roles.
-            - Overall project duration calculation.
-        4. Provides a description of each task attribute and general pointers for creating the estimation.
-        5. Returns the prompt in a structured JSON format.
-    Note:
-        - The function uses Streamlit to display the top 5 suggested tasks.
-        - The function ensures the correct profiles and modules are used based on the task descriptions.
-        - The function calculates the estimated price based on the profile's daily rate and estimated days.
+        bool: True if the job is still queued or running, and the page should be refreshed.
     """
-    tasks = "\n\n".join([
-        f"MSCW: {result['MSCW']}\nArea: {result['Area']}\nModule: {result['Module']}\nFeature: {result['Feature']}\nTask: {result['Task']}\nProfile: {result['Profile']}\nMinDays: {result.get('MinDays', 'N/A')}\nRealDays: {result.get('RealDays', 'N/A')}\nMaxDays: {result.get('MaxDays', 'N/A')}\n% Contingency: {result.get('Contingency', 'N/A')}\nEstimatedDays: {result.get('EstimatedDays', 'N/A')}\nEstimatedPrice: {result.get('EstimatedPrice', 'N/A')}\nPotential Issues: {', '.join(result.get('PotentialIssues', []))}" 
-        for result in search_results
-    ])
-    
+    job_id = st.session_state.get(job_key) or st.query_params.get(job_key)
+    job = get_job(job_id) if job_id else None
+    if not job:
+        return False
+
+    partial_results = job["partialResults"]
+    if job["status"] in ["queued", "running"]:
+        st.info(f"{job['stage']}... (job {job['id'][:8]})")
+        if partial_results.get("search_query"):
+            with st.expander("View Generated Search Query"):
+                st.text(partial_results["search_query"])
+        ensure_worker_running()
+        return True
+
+    if job["status"] == "failed":
+        st.error(f"The estimation failed: {job['error']}")
+        if st.button("Retry", key=f"{key_prefix}_retry"):
+            submit_estimation(job["payload"], job_key, force=True)
+            st.rerun()
+        return False
+
+    result = job["result"]
     # Create a collapse for displaying the best ranked tasks
     with st.expander("View Top 5 Suggested Tasks"):
-        tasks_json = [json.dumps(result, indent=4) for result in search_results]
-        tasks_json_output = '[\n' + ',\n'.join(tasks_json) + '\n]'
-        st.json(tasks_json_output)
-        
-    return f"""
-    Context:
-    The user has described their project as follows:
-    {user_prompt}
-
-    The following tasks were retrieved based on the user's project description:
-    {tasks}
-
-    Instructions:
-        - Create a detailed project estimation from the user prompt using these tasks.
-        Do not blindly copy the tasks but use them as a guideline to create the new estimated tasks.
-        - For each task:
-            - Provide a clear timeline (in days) for its completion.
-            - Identify any risks, delays, or dependencies that could impact the task.
-            - Include the task's estimated price (based on the Profile and EstimatedDays) and any required resources or roles.
-        - Calculate the overall project duration, including potential buffer times for dependencies or risks.
-        - Present the estimation in a structured format, such as a table or JSON.
-
-    Description:
-        1. **MSCW**: The priority of the task. The options are: "1 Must Have", "2 Should Have", "3 Could Have"
-        2. **Area**: The area of the project where the task belongs. The options are: "01 Analyze & Design", "03 Setup", "04 Development"
-        3. **Module**: The software engineering domain of the task. The options are: "Overall", "Frontend", "Middleware", "Infra", "IoT", "Security"
-        4. **Feature**: What exactly is being done in the task. The options are: "General", "Technical Lead", "Project Manager", "Sprint Artifacts & Meetings", "Technical Analysis", "Functional Analysis", "User Experience (UX)", "User Interface (UI)", "Security Review", "Go-Live support", "Setup Environment + Azure", "Setup Projects", "Authentication & Authorizations", "Monitoring", "Notifications", "Settings" , "Filtering / search"
-        5. **Task**: Summarize the task in a detailed sentence or two.
-        6. **Profile**: The role of the person who will perform the task. The options are the ones we defined above with their rates, and you will not deviate from this list of possible profiles. If the profiles have a number at the beginning, you should keep it, for example, "0 Blended FE dev" or "1 Analyst".
-        7. **MinDays**: The estimated minimum number of days required to complete the task.
-        8. **RealDays**: The average or most likely number of days required to complete the task.
-        9. **MaxDays**: The estimated maximum number of days required to complete the task.
-        10. **Contingency**: For this write "0" for now.
-        11. **EstimatedDays**: This is a value between MinDays and MaxDays, which means it can also be 0. The formula rounds EstimatedDays to the nearest number, rounding down if it's greater than RealDays and up otherwise.
-        12. **EstimatedPrice**: this is a formula that calculates the estimated price based on the EstimatedDays and the cost of the Profile. The formula is: EstimatedDays * the cost of the Profile. If the EstimatedDays is 0, then you should only charge half of the Profile's daily rate.
-        13. **Potential Issues**: List potential risks or issues that might arise, such as “security concerns,” “data compliance requirements,” or “scope changes.”
-
-    General pointers:
-        - Keep the estimated days low. Anywhere from 0 for MinDays to 4 days for MaxDays is a good estimate.
-        - Make sure that you think about how many tasks there need to be. Don't just copy the amount of tasks from the search_results.
-        - Make sure that the "Task" description contains relevant information from the requirements of the user prompt.
-        - Make sure not to use the same Area for every task. Try to distribute the tasks across different Areas.
-        - Make sure to use a wide variety of Profiles for the tasks. Don't use the same Profile for every task. Make sure to choose the right Profile for the right task (the 'Task' field describes the task).
-        - Make sure to have different MSCW priorities for the tasks.
-        - Make sure to have more "Must Have" and "Should Have" tasks than "Could Have" tasks. The ratio should be 2:1:1 respectively.
-        - Make sure that the tasks are assigned in order of Must Have then Should Have then Could Have.
-        - Make sure that not every task contains "Potential Issues". You may assign them, but only if the possibility of it happening is likely.
-        - Temporary: You should ignore the "Offshore" roles.
-        - The cost per profile varies: Each Profile has an associated daily rate, which must be used to calculate the EstimatedPrice.
-          These rates are as follows: {fetch_roles_and_rates()}. These rates are the most up-to-date rates. You will NOT deviate from these rates, regardless of what the search results says.
-        - Make sure to use the correct Profile for the task. The search results may contain incorrect Profiles, so you must choose the correct one based on the task description. Also make sure the profiles exist in the rates table.
-        - Make sure to use the correct Module for the chosen Profile. If the Profile is "0 Blended MW dev" then the Module should be "Middleware", for example.
-
-
-
-    Return your response in the following JSON format:
-    {{
-        "tasks": [
-            {{
-                "MSCW": "1 Must Have",
-                "Area": "01 Analyze & Design",
-                "Module": "Frontend",
-                "Feature": "Technical Analysis",
-                "Task": "Analysis of the design requirements for the client",
-                "Profile": "0 Blended FE dev",
-                "MinDays": 1,
-                "RealDays": 2,
-                "MaxDays": 2,
-                "% Contingency": "0%",
-                "EstimatedDays": 2,
-                "EstimatedPrice": 400,
-                "Potential Issues": "We might need to consult with the client for additional requirements"
-            }},
-            ...
-        ]
-    }}
-    """
-
-def ask_openai_for_estimation(prompt):
-    """
-    Sends a prompt to the OpenAI API and returns the estimated response.
-    Args:
-        prompt (str): The prompt to send to the OpenAI API for estimation.
-    Returns:
-        str: The estimated response from the OpenAI API if the request is successful.
-        None: If there is an error in the request or response.
-    Raises:
-        Exception: If an error occurs during the request to the OpenAI API.
-    """
-    headers = {
-        "Content-Type": "application/json",
-        "api-key": st.secrets["OPENAI_API_KEY"],
-    }
-
-    data = {
-        "messages": [{"role": "user", "content": prompt}],
-        "max_tokens": 3000,
-        "temperature": 0.1
-    }
-
-    try:
-        response = requests.post(
-            st.secrets["OPENAI_ENDPOINT"], headers=headers, json=data
-        )
-        if response.status_code == 200:
-            return response.json()["choices"][0]["message"]["content"].strip()
-        else:
-            st.error(f"Error in OpenAI estimation request: {response.json()}")
-            return None
-    except Exception as e:
-        st.error(f"An error occurred during OpenAI estimation request: {str(e)}")
-        return None
-
-def parse_and_display_estimation(response_json):
-    """
-    Parses the estimation response JSON and displays the project estimation in a Streamlit app.
-    This function performs the following tasks:
-    1. Checks if the response JSON is empty and displays an error message if it is.
-    2. Parses the response JSON to extract tasks.
-    3. Checks if tasks are present in the parsed data and displays an error message if none are found.
-    4. Displays the project estimation title.
-    5. Displays the tasks in a DataFrame format.
-    6. Provides download options for the estimation as an Excel file and JSON file.
-    7. Exports profiles to a JSON file and provides a download button.
-    Args:
-        response_json (str): The JSON response containing the project estimation.
-    Raises:
-        json.JSONDecodeError: If there is an error decoding the JSON response.
-        Exception: If there is any other error while parsing the estimation response.
-    """
-    try:
-        # Check if response_json is empty
-        if not response_json:
-            st.error("Received empty response for estimation.")
-            return
-        
-        # Parse the response JSON
-        data = json.loads(response_json)
-        tasks = data.get("tasks", [])
-        
-        # Check if tasks are present
-        if not tasks:
-            st.error("No tasks found in the estimation.")
-            return
-
-        # Display title for project estimation
-        st.write(f"### Estimated Project")
-
-        # Display tasks as a DataFrame
-        if tasks:
-            df = pd.DataFrame(tasks)
-            st.dataframe(df)
+        st.json(result["searchResults"])
+    if result.get("droppedTasks"):
+        st.warning(f"{result['droppedTasks']} task(s) could not be repaired and were left out of the estimation.")
+    display_estimation(result["tasks"], key_prefix=key_prefix)
+    return False
+#endregion
 
-            # Generate Excel download option
-            excel_buffer = io.BytesIO()
-            with pd.ExcelWriter(excel_buffer, engine="openpyxl") as writer:
-                df.to_excel(writer, index=False, sheet_name="Project Estimation")
-            excel_buffer.seek(0)
-            
-            # Generate JSON download option
-            json_data = json.dumps(tasks, indent=4)  # Convert tasks to formatted JSON
-            
-            
-            ### DOWNLOAD BUTTONS
-            col1, col2 = st.columns(2)
-            with col1:
-                st.download_button(
-                    label="Download Estimation as Excel",
-                    data=excel_buffer,
-                    file_name="project_estimation.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+#region Streamlit UI
+# Profile this rerun with ?profile=1 (or PROFILE=1), see util/profiling.py.
+# The query parameter is removed, so only this rerun is profiled and not the reruns that follow.
+profiler = start_profiling("streamlit_main", st.query_params.pop("profile", None) == "1")
+
+try:
+    st.header("AI-Driven Project Estimation Tool")
+
+    # Tabs for the interface
+    tabs = st.tabs(["PDF Document", "Prompt", "History"])
+
+    # Estimation Tool tab
+    with tabs[0]:
+        # Initialize session state for PDF content
+        if "pdf_content" not in st.session_state:
+            st.session_state.pdf_content = None
+            st.session_state.pdf_hash = None
+            st.session_state.pdf_url = None
+
+        # File uploader
+        uploaded_file = st.file_uploader("Upload a PDF document containing information about the project", type=["pdf"])
+
+        # Additional requirements input
+        user_prompt = st.text_area("Additional project requirements (optional):")
+
+        if uploaded_file:
+            project_title = st.text_input("Project title", value=os.path.splitext(uploaded_file.name)[0])
+
+            # The hash is needed before the upload, to look up previous estimations of the same PDF.
+            # It is computed once per uploaded file instead of on every rerun, and passed on to the upload.
+            if st.session_state.get("pdf_file_id") != uploaded_file.file_id:
+                st.session_state.pdf_file_id = uploaded_file.file_id
+                st.session_state.pdf_file_hash = compute_file_hash(uploaded_file)
+            pdf_hash = st.session_state.pdf_file_hash
+            if st.session_state.pdf_hash != pdf_hash:
+                st.session_state.pdf_hash = pdf_hash
+                st.session_state.pdf_content = None
+                st.session_state.pdf_url = None
+                st.session_state.pop("job_id_0", None)
+                st.query_params.pop("job_id_0", None)
+
+            # Reuse the OCR result of a previous estimation of the same PDF
+            previous_estimation = find_estimation_by_pdf_hash(pdf_hash)
+            if previous_estimation and st.session_state.pdf_content is None:
+                st.session_state.pdf_content = previous_estimation["pdfContent"]
+
+            # The PDF itself is analyzed by the estimation job
+            if st.session_state.pdf_content is None and st.session_state.pdf_url is None:
+                upload_progress = st.progress(0.0, text="Uploading PDF...")
+                st.session_state.pdf_url = upload_pdf_to_azure(
+                    uploaded_file,
+                    content_hash=pdf_hash,
+                    progress_callback=lambda uploaded, total: upload_progress.progress(
+                        min(uploaded / total, 1.0) if total else 0.0,
+                        text=f"Uploading PDF... {uploaded / 1024 / 1024:.1f} MB",
+                    ),
                 )
-            with col2:
-                st.download_button(
-                    label="Download Estimation as JSON",
-                    data=json_data,
-                    file_name="project_estimation.json",
-                    mime="application/json",
+                upload_progress.empty()
+
+            if previous_estimation:
+                st.info(f"This PDF was already estimated on {previous_estimation['createdAt']} as '{previous_estimation['projectTitle']}'.")
+                if st.button("Show Previous Estimation", key="previous_button_0"):
+                    display_estimation(previous_estimation["tasks"], key_prefix="previous_0")
+
+            if (st.session_state.pdf_content or st.session_state.pdf_url) and st.button("Generate Project Estimation", key="generate_button_0"):
+                submit_estimation(
+                    {
+                        "user_prompt": user_prompt,
+                        "project_title": project_title,
+                        "pdf_hash": pdf_hash,
+                        "pdf_url": st.session_state.pdf_url,
+                        "pdf_page_count": count_pdf_pages(uploaded_file),
+                        "pdf_content": st.session_state.pdf_content,
+                    },
+                    "job_id_0",
                 )
-            
-            
-            # Export profiles to JSON
-            profile_data = df["Profile"].to_json(index=False).encode("utf-8")
-            st.download_button(
-                label="profiles.json",
-                data=profile_data,
-                file_name="profiles.json",
-                mime="application/json",
+
+        poll_jobs = display_estimation_job("job_id_0", key_prefix="estimation_0")
+
+    # Generated Prompt tab
+    with tabs[1]:
+        project_title = st.text_input("Project title", key="project_title_1")
+        user_prompt = st.text_area("Describe your project requirements:")
+        if st.button("Generate Project Estimation", key="generate_button_1"):
+            if user_prompt:
+                submit_estimation({"user_prompt": user_prompt, "project_title": project_title or "Untitled project"}, "job_id_1")
+
+        poll_jobs = display_estimation_job("job_id_1", key_prefix="estimation_1") or poll_jobs
+
+    # History tab
+    with tabs[2]:
+        estimations = fetch_estimations()
+        if not estimations.empty:
+            estimation_id = st.selectbox(
+                "Select a previous estimation",
+                options=estimations["id"],
+                format_func=lambda x: " - ".join(estimations.loc[estimations["id"] == x, ["createdAt", "projectTitle"]].values[0]),
             )
+            estimation = load_estimation(estimation_id)
+            if estimation:
+                st.caption(f"Rates version: {estimation['ratesVersion']} | PDF hash: {estimation['pdfHash'] or 'N/A'}")
+                display_estimation(estimation["tasks"], key_prefix="history")
+                with st.expander("View Search Results"):
+                    st.json(estimation["searchResults"])
+                with st.expander("View Estimation Prompt"):
+                    st.text(estimation["prompt"] or "")
         else:
-            st.error("No tasks found in the estimation.")
-    
-    except json.JSONDecodeError as e:
-        st.error(f"JSON decoding error: {str(e)}")
-    except Exception as e:
-        st.error(f"Error while parsing estimation response: {str(e)}")
-#endregion
-
-#region Streamlit UI
-st.header("AI-Driven Project Estimation Tool")
-
-# Tabs for the interface
-tabs = st.tabs(["PDF Document", "Prompt"])
-
-# Estimation Tool tab
-with tabs[0]:
-    # Initialize session state for PDF content
-    if "pdf_content" not in st.session_state:
-        st.session_state.pdf_content = None
-
-    # File uploader
-    uploaded_file = st.file_uploader("Upload a PDF document containing information about the project", type=["pdf"])
-
-    # Additional requirements input
-    user_prompt = st.text_area("Additional project requirements (optional):")
-
-    if uploaded_file:
-        if st.session_state.pdf_content is None:
-            with st.spinner("Uploading and analyzing PDF..."):
-                pdf_url = upload_pdf_to_azure(uploaded_file)
-                if pdf_url:
-                    st.session_state.pdf_content = analyze_pdf(pdf_url, is_url=True)
-
-        if st.session_state.pdf_content and st.button("Generate Project Estimation", key="generate_button_0"):
-            with st.spinner("Generating query..."):
-                search_query = generate_search_query(user_prompt, pdf_content=st.session_state.pdf_content)
-
-            if search_query:
-                with st.spinner("Querying Azure AI Search..."):
-                    search_results = query_azure_ai_search(search_query)
-
-                if search_results:
-                    with st.spinner("Generating project estimation..."):
-                        estimation_prompt = construct_estimation_prompt(
-                            search_results,
-                            user_prompt
-                        )
-                        ai_response = ask_openai_for_estimation(estimation_prompt)
-
-                    if ai_response:
-                        st.session_state.generated_prompt = estimation_prompt  # Save the prompt for display in the second tab
-                        parse_and_display_estimation(ai_response)
-                    else:
-                        st.error("No response from OpenAI for estimation.")
-
-# Generated Prompt tab
-with tabs[1]:
-    user_prompt = st.text_area("Describe your project requirements:")
-    if st.button("Generate Project Estimation", key="generate_button_1"):
-        if user_prompt:
-            with st.spinner("Generating query..."):
-                search_query = generate_search_query(user_prompt)
-
-            if search_query:
-                with st.spinner("Querying Azure AI Search..."):
-                    search_results = query_azure_ai_search(search_query)
-
-                if search_results:
-                    with st.spinner("Generating project estimation..."):
-                        estimation_prompt = construct_estimation_prompt(search_results, user_prompt)
-                        ai_response = ask_openai_for_estimation(estimation_prompt)
-
-                    if ai_response:
-                        parse_and_display_estimation(ai_response)
+            st.info("No estimations have been stored yet.")
+finally:
+    stop_profiling(profiler)
+
+# Poll the running estimation jobs
+if poll_jobs:
+    time.sleep(2)
+    st.rerun()
 #endregion
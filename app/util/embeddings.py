@@ -0,0 +1,189 @@
+"""
+Pluggable embedding providers with a local content-hash cache.
+
+The provider is chosen with the `EMBEDDING_PROVIDER` environment variable:
+- "azure-openai": an Azure OpenAI embedding deployment (`AZURE_OPENAI_EMBEDDING_ENDPOINT`, `OPENAI_API_KEY`)
+- "sentence-transformers": a local model (`EMBEDDING_MODEL`), requires the `sentence-transformers` package
+- "hashing": a dependency-free hashing stub that works offline, useful for development and testing
+
+If `EMBEDDING_PROVIDER` is not set, Azure OpenAI is used when its endpoint is configured, and the hashing stub otherwise.
+The knowledge base and the search queries must use the same provider, so the index is built with the provider's
+dimensions (see `build_knowledge_base.py`).
+"""
+
+import os
+import re
+import sqlite3
+import hashlib
+import requests
+import numpy as np
+from dotenv import load_dotenv
+
+
+load_dotenv()
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", os.path.join(DATA_DIR, "embedding_cache.db"))
+
+
+class AzureOpenAIEmbeddingProvider:
+    """Embeddings from an Azure OpenAI embedding deployment."""
+
+    def __init__(self):
+        self.endpoint = os.getenv("AZURE_OPENAI_EMBEDDING_ENDPOINT")
+        self.api_key = os.getenv("OPENAI_API_KEY")
+        self.dimensions = int(os.getenv("EMBEDDING_DIMENSIONS") or 1536)
+        self.name = f"azure-openai:{self.endpoint}:{self.dimensions}"
+
+    def embed(self, texts):
+        response = requests.post(
+            self.endpoint,
+            headers={"Content-Type": "application/json", "api-key": self.api_key},
+            json={"input": texts},
+            timeout=60,
+        )
+        response.raise_for_status()
+        data = sorted(response.json()["data"], key=lambda item: item["index"])
+        return np.array([item["embedding"] for item in data], dtype=np.float32)
+
+
+class SentenceTransformerEmbeddingProvider:
+    """Embeddings from a local sentence-transformers model."""
+
+    def __init__(self):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise ImportError("Install `sentence-transformers` to use the local embedding provider.") from e
+
+        model_name = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+        self.model = SentenceTransformer(model_name)
+        self.dimensions = self.model.get_sentence_embedding_dimension()
+        self.name = f"sentence-transformers:{model_name}"
+
+    def embed(self, texts):
+        return np.asarray(self.model.encode(texts, normalize_embeddings=True), dtype=np.float32)
+
+
+class HashingEmbeddingProvider:
+    """Offline stub: hashes the words of a text into a fixed number of dimensions."""
+
+    def __init__(self):
+        self.dimensions = int(os.getenv("EMBEDDING_DIMENSIONS") or 256)
+        self.name = f"hashing:{self.dimensions}"
+
+    def embed(self, texts):
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in re.findall(r"\w+", text.lower()):
+                digest = int.from_bytes(hashlib.md5(word.encode("utf-8")).digest()[:8], "little")
+                vectors[row, digest % self.dimensions] += 1.0 if (digest >> 63) & 1 else -1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+
+EMBEDDING_PROVIDERS = {
+    "azure-openai": AzureOpenAIEmbeddingProvider,
+    "sentence-transformers": SentenceTransformerEmbeddingProvider,
+    "hashing": HashingEmbeddingProvider,
+}
+
+_providers = {}
+
+
+def get_embedding_provider(name=None):
+    """
+    Returns the configured embedding provider. Providers are created once per process, and the provider that is
+    used is logged when it is created.
+
+    Args:
+        name (str): The name of the provider. Defaults to the `EMBEDDING_PROVIDER` environment variable.
+
+    Returns:
+        object: The provider, with a `name`, its `dimensions` and an `embed(texts)` method.
+    """
+    defaulted = False
+    if name is None:
+        name = os.getenv("EMBEDDING_PROVIDER")
+        if not name:
+            name = "azure-openai" if os.getenv("AZURE_OPENAI_EMBEDDING_ENDPOINT") else "hashing"
+            defaulted = True
+    if name not in EMBEDDING_PROVIDERS:
+        raise ValueError(f"Unknown embedding provider '{name}'. Choose from: {', '.join(EMBEDDING_PROVIDERS)}")
+    if name not in _providers:
+        _providers[name] = EMBEDDING_PROVIDERS[name]()
+        provider = _providers[name]
+        print(f"Using embedding provider '{provider.name}' ({provider.dimensions} dimensions).")
+        if defaulted and name == "hashing":
+            print("Warning: EMBEDDING_PROVIDER and AZURE_OPENAI_EMBEDDING_ENDPOINT are not set, so the offline "
+                  "hashing stub is used. The knowledge base must be built with the same provider.")
+    return _providers[name]
+
+
+def _create_cache_connection():
+    os.makedirs(os.path.dirname(EMBEDDING_CACHE_PATH), exist_ok=True)
+    connection = sqlite3.connect(EMBEDDING_CACHE_PATH)
+    connection.execute("CREATE TABLE IF NOT EXISTS embeddings (contentHash TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+    return connection
+
+
+def embed_texts(texts, provider=None, batch_size=256):
+    """
+    Embeds texts in batches. Embeddings are cached by a hash of the provider and the text,
+    so unchanged texts are never embedded twice.
+
+    Args:
+        texts (list): The texts to embed.
+        provider (object): The embedding provider. Defaults to `get_embedding_provider()`.
+        batch_size (int): The number of texts sent to the provider at once.
+
+    Returns:
+        np.ndarray: One float32 vector per text.
+    """
+    provider = provider or get_embedding_provider()
+    hashes = [hashlib.sha256(f"{provider.name}\n{text}".encode("utf-8")).hexdigest() for text in texts]
+    vectors = np.zeros((len(texts), provider.dimensions), dtype=np.float32)
+
+    connection = _create_cache_connection()
+    cached = {}
+    unique_hashes = list(dict.fromkeys(hashes))
+    for start in range(0, len(unique_hashes), 500):
+        chunk = unique_hashes[start:start + 500]
+        rows = connection.execute(
+            f"SELECT contentHash, vector FROM embeddings WHERE contentHash IN ({','.join('?' * len(chunk))})", chunk
+        ).fetchall()
+        cached.update({content_hash: np.frombuffer(vector, dtype=np.float32) for content_hash, vector in rows})
+
+    missing = {}
+    for position, content_hash in enumerate(hashes):
+        if content_hash in cached:
+            vectors[position] = cached[content_hash]
+        else:
+            missing.setdefault(content_hash, []).append(position)
+
+    missing_hashes = list(missing)
+    for start in range(0, len(missing_hashes), batch_size):
+        batch = missing_hashes[start:start + batch_size]
+        embedded = provider.embed([texts[missing[content_hash][0]] for content_hash in batch])
+        for content_hash, vector in zip(batch, embedded):
+            vectors[missing[content_hash]] = vector
+        with connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO embeddings (contentHash, vector) VALUES (?, ?)",
+                [(content_hash, vector.astype(np.float32).tobytes()) for content_hash, vector in zip(batch, embedded)],
+            )
+    connection.close()
+    return vectors
+
+
+def task_embedding_text(task):
+    """
+    Builds the text that is embedded for a task, from its descriptive fields.
+
+    Args:
+        task (dict): A task document.
+
+    Returns:
+        str: The text to embed.
+    """
+    return " | ".join(str(task.get(field, "")) for field in ["Feature", "Task", "Module", "Area", "Profile"])
@@ -0,0 +1,343 @@
+"""
+Persistent queue of estimation jobs, stored in a local SQLite database.
+
+The Streamlit app submits a job and polls its status by job ID. `estimation_worker.py` claims queued jobs and runs
+them in a pool of worker processes, reporting the stage and partial results of every job as it goes. A job is not
+queued twice while the same input is still queued or running, and jobs that were running when the worker stopped
+are queued again when it restarts.
+"""
+
+import os
+import sys
+import json
+import uuid
+import time
+import sqlite3
+import hashlib
+import subprocess
+import pandas as pd
+
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+JOB_STORE_PATH = os.getenv("JOB_STORE_PATH", os.path.join(DATA_DIR, "jobs.db"))
+WORKER_SCRIPT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "estimation_worker.py")
+WORKER_LOG_PATH = os.getenv("WORKER_LOG_PATH", os.path.join(DATA_DIR, "estimation_worker.log"))
+
+# Payload fields that do not change the outcome of a job, and are left out of its input hash
+_UNHASHED_FIELDS = {"pdf_url", "pdf_page_count", "pdf_content"}
+
+
+def _now():
+    return pd.Timestamp.now().strftime('%Y-%m-%d %H:%M:%S')
+
+
+def create_job_connection():
+    """
+    Opens the job store, creating its tables if they do not exist yet.
+
+    Returns:
+        sqlite3.Connection: A connection to the job store.
+    """
+    os.makedirs(os.path.dirname(JOB_STORE_PATH), exist_ok=True)
+    connection = sqlite3.connect(JOB_STORE_PATH, timeout=30)
+    connection.row_factory = sqlite3.Row
+    connection.executescript(
+        """
+        PRAGMA journal_mode = WAL;
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            inputHash TEXT NOT NULL,
+            status TEXT NOT NULL,
+            stage TEXT,
+            payload TEXT NOT NULL,
+            partialResults TEXT NOT NULL DEFAULT '{}',
+            result TEXT,
+            error TEXT,
+            createdAt TEXT NOT NULL,
+            updatedAt TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_jobs_input_hash ON jobs (inputHash);
+        CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, createdAt);
+        CREATE TABLE IF NOT EXISTS workers (
+            pid INTEGER PRIMARY KEY,
+            lastSeen REAL NOT NULL
+        );
+        """
+    )
+    return connection
+
+
+def compute_input_hash(payload):
+    """
+    Computes the hash that identifies the input of a job.
+
+    Args:
+        payload (dict): The job input.
+
+    Returns:
+        str: The SHA-256 hash of the input.
+    """
+    hashed = {key: value for key, value in payload.items() if key not in _UNHASHED_FIELDS}
+    return hashlib.sha256(json.dumps(hashed, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def submit_job(payload, force=False):
+    """
+    Queues an estimation job. If a job with the same input is still queued or running, that job is returned instead.
+    Finished jobs are never reused, so submitting the same input again gives a fresh estimation.
+
+    Args:
+        payload (dict): The job input, see `run_estimation_pipeline`.
+        force (bool): Always queue a new job, even if the same input is still queued or running.
+
+    Returns:
+        str: The ID of the (existing or new) job.
+    """
+    input_hash = compute_input_hash(payload)
+    connection = create_job_connection()
+    with connection:
+        row = None
+        if not force:
+            row = connection.execute(
+                """
+                SELECT id FROM jobs WHERE inputHash = ? AND status IN ('queued', 'running')
+                ORDER BY createdAt DESC LIMIT 1
+                """,
+                (input_hash,),
+            ).fetchone()
+        job_id = row["id"] if row else uuid.uuid4().hex
+    if row:
+        connection.close()
+        return job_id
+
+    with connection:
+        connection.execute(
+            """
+            INSERT INTO jobs (id, inputHash, status, stage, payload, createdAt, updatedAt)
+            VALUES (?, ?, 'queued', 'Waiting for a worker', ?, ?, ?)
+            """,
+            (job_id, input_hash, json.dumps(payload), _now(), _now()),
+        )
+    connection.close()
+    return job_id
+
+
+def _row_to_job(row):
+    job = dict(row)
+    job["payload"] = json.loads(job["payload"])
+    job["partialResults"] = json.loads(job["partialResults"])
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    return job
+
+
+def get_job(job_id):
+    """
+    Returns the status, stage, partial results and result of a job.
+
+    Args:
+        job_id (str): The ID of the job.
+
+    Returns:
+        dict: The job, or None if it does not exist.
+    """
+    connection = create_job_connection()
+    row = connection.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    connection.close()
+    return _row_to_job(row) if row else None
+
+
+def claim_next_job(job_id=None):
+    """
+    Marks the oldest queued job (or the given job, if it is queued) as running and returns it.
+
+    Args:
+        job_id (str): The ID of the job to claim. The oldest queued job is claimed if not given.
+
+    Returns:
+        dict: The claimed job, or None if no (such) job is queued.
+    """
+    connection = create_job_connection()
+    connection.isolation_level = None
+    try:
+        # BEGIN IMMEDIATE takes the write lock, so two workers can never claim the same job
+        connection.execute("BEGIN IMMEDIATE")
+        if job_id is None:
+            row = connection.execute(
+                "SELECT * FROM jobs WHERE status = 'queued' ORDER BY createdAt, rowid LIMIT 1"
+            ).fetchone()
+        else:
+            row = connection.execute("SELECT * FROM jobs WHERE status = 'queued' AND id = ?", (job_id,)).fetchone()
+        if row:
+            connection.execute(
+                "UPDATE jobs SET status = 'running', stage = 'Starting', updatedAt = ? WHERE id = ?",
+                (_now(), row["id"]),
+            )
+        connection.execute("COMMIT")
+    finally:
+        connection.close()
+    return _row_to_job(row) if row else None
+
+
+def update_job_progress(job_id, stage, **partial_results):
+    """
+    Records the current stage of a running job, and merges its partial results.
+
+    Args:
+        job_id (str): The ID of the job.
+        stage (str): A description of the current stage.
+        **partial_results: Intermediate results to make available to the app.
+
+    Returns:
+        None
+    """
+    connection = create_job_connection()
+    with connection:
+        row = connection.execute("SELECT partialResults FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        merged = json.loads(row["partialResults"]) if row else {}
+        merged.update(partial_results)
+        connection.execute(
+            "UPDATE jobs SET stage = ?, partialResults = ?, updatedAt = ? WHERE id = ?",
+            (stage, json.dumps(merged), _now(), job_id),
+        )
+    connection.close()
+
+
+def finish_job(job_id, result=None, error=None):
+    """
+    Marks a job as succeeded (with its result) or failed (with an error message).
+
+    Args:
+        job_id (str): The ID of the job.
+        result (dict): The result of the job, if it succeeded.
+        error (str): The error message, if it failed.
+
+    Returns:
+        None
+    """
+    connection = create_job_connection()
+    with connection:
+        connection.execute(
+            "UPDATE jobs SET status = ?, stage = ?, result = ?, error = ?, updatedAt = ? WHERE id = ?",
+            (
+                "failed" if error else "succeeded",
+                "Failed" if error else "Done",
+                json.dumps(result) if result is not None else None,
+                error,
+                _now(),
+                job_id,
+            ),
+        )
+    connection.close()
+
+
+def requeue_interrupted_jobs(job_ids=None):
+    """
+    Queues the jobs that were still running when the worker stopped again.
+
+    Args:
+        job_ids (list): The IDs of the interrupted jobs. Every running job is queued again if not given.
+
+    Returns:
+        int: The number of jobs that were queued again.
+    """
+    query = "UPDATE jobs SET status = 'queued', stage = 'Waiting for a worker', updatedAt = ? WHERE status = 'running'"
+    params = [_now()]
+    if job_ids is not None:
+        query += f" AND id IN ({','.join('?' * len(job_ids))})"
+        params.extend(job_ids)
+    connection = create_job_connection()
+    with connection:
+        cursor = connection.execute(query, params)
+    connection.close()
+    return cursor.rowcount
+
+
+def record_worker_heartbeat(pid):
+    """
+    Records that the worker with the given process ID is alive.
+
+    Args:
+        pid (int): The process ID of the worker.
+
+    Returns:
+        None
+    """
+    connection = create_job_connection()
+    with connection:
+        connection.execute("INSERT OR REPLACE INTO workers (pid, lastSeen) VALUES (?, ?)", (pid, time.time()))
+        connection.execute("DELETE FROM workers WHERE lastSeen < ?", (time.time() - 3600,))
+    connection.close()
+
+
+def claim_worker_role(pid, max_age=15):
+    """
+    Makes the given process the estimation worker, unless another worker is alive. The check and the heartbeat
+    happen in one exclusive transaction, so two workers that start at the same time can never both claim the role.
+
+    Args:
+        pid (int): The process ID of the worker.
+        max_age (int): The maximum age of the heartbeat of a live worker, in seconds.
+
+    Returns:
+        bool: True if this process is now the worker, False if another worker is alive.
+    """
+    connection = create_job_connection()
+    connection.isolation_level = None
+    try:
+        connection.execute("BEGIN IMMEDIATE")
+        # The placeholder heartbeat (pid 0) of `ensure_worker_running` does not count as a live worker
+        row = connection.execute(
+            "SELECT MAX(lastSeen) AS lastSeen FROM workers WHERE pid NOT IN (0, ?)", (pid,)
+        ).fetchone()
+        if row["lastSeen"] is not None and time.time() - row["lastSeen"] < max_age:
+            connection.execute("ROLLBACK")
+            return False
+        connection.execute("INSERT OR REPLACE INTO workers (pid, lastSeen) VALUES (?, ?)", (pid, time.time()))
+        connection.execute("COMMIT")
+        return True
+    finally:
+        connection.close()
+
+
+def is_worker_alive(max_age=15, ignore_pids=()):
+    """
+    Checks whether a worker has recorded a heartbeat recently.
+
+    Args:
+        max_age (int): The maximum age of the heartbeat, in seconds.
+        ignore_pids (tuple): Process IDs whose heartbeats are ignored.
+
+    Returns:
+        bool: True if a worker is alive.
+    """
+    connection = create_job_connection()
+    row = connection.execute(
+        f"SELECT MAX(lastSeen) AS lastSeen FROM workers WHERE pid NOT IN ({','.join('?' * len(ignore_pids))})",
+        tuple(ignore_pids),
+    ).fetchone()
+    connection.close()
+    return row["lastSeen"] is not None and time.time() - row["lastSeen"] < max_age
+
+
+def ensure_worker_running():
+    """
+    Starts `estimation_worker.py` in the background if no worker is alive.
+    Its output is appended to WORKER_LOG_PATH, so a worker that crashes leaves a trace.
+
+    Returns:
+        bool: True if a worker was started.
+    """
+    if is_worker_alive():
+        return False
+    os.makedirs(os.path.dirname(WORKER_LOG_PATH), exist_ok=True)
+    with open(WORKER_LOG_PATH, "a") as log_file:
+        subprocess.Popen(
+            [sys.executable, "-u", WORKER_SCRIPT_PATH],
+            cwd=os.path.dirname(WORKER_SCRIPT_PATH),
+            stdout=log_file,
+            stderr=subprocess.STDOUT,
+            start_new_session=True,
+        )
+    # Placeholder heartbeat (pid 0) until the worker records its own, so the next rerun does not start a second one
+    record_worker_heartbeat(0)
+    return True
@@ -0,0 +1,628 @@
+"""
+The estimation pipeline: PDF upload and analysis, query generation, Azure AI Search, and the OpenAI estimation.
+
+These functions are used by the Streamlit app and by the background worker (`estimation_worker.py`), which runs
+`run_estimation_pipeline` for the jobs in the estimation queue.
+"""
+
+import time
+import base64
+import hashlib
+import requests
+import streamlit as st
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from azure.storage.blob import BlobServiceClient, BlobBlock, ContentSettings
+from util.query_roles_and_rates_from_db import fetch_roles_and_rates
+from util.estimation_pricing import parse_roles_and_rates, price_tasks
+from util.estimation_schema import (
+    MSCW_OPTIONS,
+    AREA_OPTIONS,
+    MODULE_OPTIONS,
+    FEATURE_OPTIONS,
+    format_options,
+    compact_format_instructions,
+    expand_estimation_response,
+    build_repair_prompt,
+    merge_repaired_rows,
+)
+from util.embeddings import embed_texts, get_embedding_provider
+from util.search_cache import get_cached_results, store_results
+from util.index_state import get_active_index_name
+from util.estimation_store import save_estimation
+from util.pdf_analysis_cache import get_cached_page_ranges, store_page_range
+import json
+
+#region PDF Upload and Analysis
+UPLOAD_BLOCK_SIZE = 4 * 1024 * 1024
+UPLOAD_MAX_CONCURRENCY = 4
+PAGES_PER_RANGE = 10
+ANALYSIS_MAX_CONCURRENCY = 4
+
+def stage_blocks_in_parallel(blob_client, stream, block_size=UPLOAD_BLOCK_SIZE, max_concurrency=UPLOAD_MAX_CONCURRENCY,
+                             total_size=None, progress_callback=None, content_hash=None):
+    """
+    Streams a file to a block blob: reads it block by block, stages the blocks in parallel and commits them.
+    At most `max_concurrency` blocks are in memory at once, so memory use stays below block_size * max_concurrency
+    regardless of the size of the file. The SHA-256 hash of the content is computed while streaming, unless it is given.
+    Args:
+        blob_client (BlobClient): The client of the blob to upload to.
+        stream (file-like): The file to upload, read from its current position.
+        block_size (int): The size of every block, in bytes.
+        max_concurrency (int): The maximum number of blocks staged at the same time.
+        total_size (int): The size of the file, used for progress reporting.
+        progress_callback (callable): Called with (uploaded_bytes, total_size) in the calling thread after every block.
+        content_hash (str): The SHA-256 hash of the content, if it is already known.
+    Returns:
+        tuple: The committed block IDs and the SHA-256 hash of the content.
+    """
+    hasher = hashlib.sha256() if content_hash is None else None
+    block_ids = []
+    in_flight = {}
+    uploaded_bytes = 0
+
+    def report_finished(futures):
+        nonlocal uploaded_bytes
+        for future in futures:
+            future.result()  # Raises the exception of a failed block
+            uploaded_bytes += in_flight.pop(future)
+            if progress_callback:
+                progress_callback(uploaded_bytes, total_size)
+
+    with ThreadPoolExecutor(max_workers=max_concurrency) as pool:
+        while True:
+            if len(in_flight) >= max_concurrency:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                report_finished(done)
+
+            chunk = stream.read(block_size)
+            if not chunk:
+                break
+            if hasher:
+                hasher.update(chunk)
+
+            # Block IDs must all have the same length
+            block_id = base64.b64encode(f"{len(block_ids):08d}".encode("utf-8")).decode("utf-8")
+            block_ids.append(block_id)
+            in_flight[pool.submit(blob_client.stage_block, block_id, chunk, length=len(chunk))] = len(chunk)
+
+        report_finished(wait(in_flight).done)
+
+    if hasher:
+        content_hash = hasher.hexdigest()
+    blob_client.commit_block_list(
+        [BlobBlock(block_id=block_id) for block_id in block_ids],
+        content_settings=ContentSettings(content_type="application/pdf"),
+        metadata={"sha256": content_hash},
+    )
+    return block_ids, content_hash
+
+def upload_pdf_to_azure(uploaded_file, progress_callback=None, content_hash=None):
+    """
+    Uploads a PDF file to an Azure Blob Storage container, streaming it in blocks that are staged in parallel.
+    Args:
+        uploaded_file (UploadedFile): The PDF file.
+        progress_callback (callable): Called with (uploaded_bytes, total_size) after every block.
+        content_hash (str): The SHA-256 hash of the file, if it is already known. It is computed while uploading otherwise.
+    Returns:
+        str: The URL of the uploaded blob, or None if the upload failed.
+    """
+    try:
+        blob_service_client = BlobServiceClient.from_connection_string(
+            st.secrets["AZURE_STORAGE_CONNECTION_STRING"]
+        )
+
+        container_client = blob_service_client.get_container_client(
+            st.secrets["AZURE_CONTAINER_NAME"]
+        )
+
+        if not container_client.exists():
+            container_client.create_container()
+
+        blob_name = uploaded_file.name
+        blob_client = container_client.get_blob_client(blob_name)
+
+        uploaded_file.seek(0)
+        stage_blocks_in_parallel(
+            blob_client,
+            uploaded_file,
+            total_size=getattr(uploaded_file, "size", None),
+            progress_callback=progress_callback,
+            content_hash=content_hash,
+        )
+        uploaded_file.seek(0)
+
+        blob_url = f"https://{st.secrets['AZURE_STORAGE_ACCOUNT_NAME']}.blob.core.windows.net/{st.secrets['AZURE_CONTAINER_NAME']}/{blob_name}"
+        
+        st.success(f"Upload successful. File URL: {blob_url}")
+        return blob_url
+
+    except Exception as e:
+        st.error(f"An error occurred during upload: {str(e)}")
+        return None
+
+def count_pdf_pages(pdf_file):
+    """
+    Counts the pages of a PDF file.
+    Args:
+        pdf_file (file-like): The PDF file. It is rewound after counting.
+    Returns:
+        int: The number of pages, or None if the PDF could not be read.
+    """
+    try:
+        from pypdf import PdfReader
+
+        pdf_file.seek(0)
+        return len(PdfReader(pdf_file).pages)
+    except Exception:
+        return None
+    finally:
+        pdf_file.seek(0)
+
+def analyze_pdf(pdf_path_or_url, is_url=False, pages=None):
+    """
+    Analyzes a PDF document using the Azure Form Recognizer service.
+    Args:
+        pdf_path_or_url (str | file-like): The URL of the PDF, or the PDF file itself.
+        is_url (bool): Whether `pdf_path_or_url` is a URL.
+        pages (str): Only analyze these pages, for example "1-10". Analyzes the whole document if not given.
+    Returns:
+        str: The text content of the (analyzed pages of the) PDF, or None if the analysis failed.
+    """
+    analyze_url = f"{st.secrets['DOC_INTEL_ENDPOINT']}/formrecognizer/documentModels/prebuilt-read:analyze?api-version=2023-07-31"
+    if pages:
+        analyze_url += f"&pages={pages}"
+    headers = {
+        "Content-Type": "application/json" if is_url else "application/octet-stream",
+        "Ocp-Apim-Subscription-Key": st.secrets["DOC_INTEL_API_KEY"],
+    }
+
+    try:
+        if is_url:
+            data = {"urlSource": pdf_path_or_url}
+            response = requests.post(analyze_url, headers=headers, json=data)
+        else:
+            # Passing the file object lets requests stream it instead of reading it into memory first
+            response = requests.post(
+                analyze_url, headers=headers, data=pdf_path_or_url
+            )
+
+        if response.status_code == 202:
+            operation_location = response.headers["Operation-Location"]
+            while True:
+                result_response = requests.get(
+                    operation_location,
+                    headers={
+                        "Ocp-Apim-Subscription-Key": st.secrets["DOC_INTEL_API_KEY"]
+                    },
+                )
+                result_json = result_response.json()
+
+                if result_json["status"] in ["succeeded", "failed"]:
+                    break
+                time.sleep(1)
+
+            if result_json["status"] == "succeeded":
+                if (
+                    "analyzeResult" in result_json
+                    and "content" in result_json["analyzeResult"]
+                ):
+                    return result_json["analyzeResult"]["content"]
+                else:
+                    st.warning("No content found in the analysis response.")
+                    return None
+        else:
+            st.error(f"Error in initiating analysis: {response.json()}")
+            return None
+    except Exception as e:
+        st.error(f"An error occurred during PDF analysis: {str(e)}")
+        return None
+
+def split_page_ranges(page_count, pages_per_range=PAGES_PER_RANGE):
+    """
+    Splits the pages of a document into consecutive ranges.
+    Args:
+        page_count (int): The number of pages.
+        pages_per_range (int): The maximum number of pages per range.
+    Returns:
+        list: The page ranges in page order, in the format of the `pages` parameter (for example ["1-10", "11-12"]).
+    """
+    return [
+        f"{first}-{min(first + pages_per_range - 1, page_count)}"
+        for first in range(1, page_count + 1, pages_per_range)
+    ]
+
+def analyze_pdf_in_page_ranges(pdf_url, pdf_hash, page_count, pages_per_range=PAGES_PER_RANGE,
+                               max_concurrency=ANALYSIS_MAX_CONCURRENCY):
+    """
+    Analyzes a long PDF as separate page ranges that run concurrently, and stitches their content back in page order.
+    Every range that succeeds is cached by the hash of the PDF, so a re-run only analyzes the ranges that failed.
+    Args:
+        pdf_url (str): The URL of the PDF.
+        pdf_hash (str): The SHA-256 hash of the PDF.
+        page_count (int): The number of pages of the PDF.
+        pages_per_range (int): The maximum number of pages per range.
+        max_concurrency (int): The maximum number of ranges analyzed at the same time.
+    Returns:
+        str: The text content of the PDF, or None if any of the ranges could not be analyzed.
+    """
+    page_ranges = split_page_ranges(page_count, pages_per_range)
+    contents = get_cached_page_ranges(pdf_hash)
+    missing = [pages for pages in page_ranges if pages not in contents]
+
+    if missing:
+        with ThreadPoolExecutor(max_workers=max_concurrency) as pool:
+            results = pool.map(lambda pages: analyze_pdf(pdf_url, is_url=True, pages=pages), missing)
+            for pages, content in zip(missing, results):
+                if content is not None:
+                    store_page_range(pdf_hash, pages, content)
+                    contents[pages] = content
+
+    if any(pages not in contents for pages in page_ranges):
+        return None
+    return "\n".join(contents[pages] for pages in page_ranges)
+#endregion
+
+#region AI Search and Task Estimation
+def generate_search_query(user_prompt, pdf_content=None):
+    """
+    Generates a search query based on the user prompt and optional PDF content.
+    """
+    openai_prompt = f"""
+    Context:
+    You are helping to create a project timeline. The user has provided details and additional requirements.
+
+    PDF Content:
+    {pdf_content if pdf_content else "No PDF content provided."}
+
+    Additional User Requirements:
+    {user_prompt}
+
+    Instructions:
+    - Write a query to search for tasks relevant to the described project.
+    - The query should focus on finding tasks with clear roles, responsibilities, or descriptions relevant to the project.
+    - Consider both the PDF content (if available) and additional requirements when forming the query.
+    - Aim for tasks that are high-priority or foundational to the type of project described.
+    - Keep the query concise but descriptive enough to retrieve meaningful results.
+
+    Query:
+    """
+
+    headers = {
+        "Content-Type": "application/json",
+        "api-key": st.secrets["OPENAI_API_KEY"],
+    }
+    data = {
+        "messages": [{"role": "user", "content": openai_prompt}],
+        "max_tokens": 150,
+        "temperature": 0.7,
+    }
+
+    try:
+        response = requests.post(
+            st.secrets["OPENAI_ENDPOINT"], headers=headers, json=data
+        )
+        if response.status_code == 200:
+            return response.json()["choices"][0]["message"]["content"].strip()
+        else:
+            st.error(f"Error in OpenAI query generation: {response.text}")
+            return None
+    except Exception as e:
+        st.error(f"An error occurred during query generation: {str(e)}")
+        return None
+
+def query_azure_ai_search(generated_query, top=5, filters=None):
+    """
+    Queries the Azure AI Search service with a generated query, using hybrid keyword + vector search.
+    If the query cannot be embedded, a keyword-only search is done instead.
+    Results are cached until the next build of the knowledge base publishes a new index version.
+    Args:
+        generated_query (str): The query string to search for.
+        top (int): The number of results to return.
+        filters (str): An OData filter expression, if any.
+    Returns:
+        list: A list of search results if the query is successful.
+        None: If there is an error in querying the Azure AI Search service.
+    Raises:
+        Exception: If there is an error while making the request to the Azure AI Search service.
+    """
+    cached_results = get_cached_results(generated_query, top, filters)
+    if cached_results is not None:
+        return cached_results
+
+    headers = {
+        "Content-Type": "application/json",
+        "api-key": st.secrets["AZURE_SEARCH_API_KEY"],
+    }
+    
+    # The active index is published by build_knowledge_base.py, the configured name (or alias) is used until then
+    index_name = get_active_index_name(st.secrets["AZURE_SEARCH_INDEX_NAME"])
+    search_url = f"{st.secrets['AZURE_SEARCH_ENDPOINT']}/indexes/{index_name}/docs/search?api-version=2024-07-01"
+
+    search_data = {
+        "search": generated_query,
+        "top": top,
+    }
+    if filters:
+        search_data["filter"] = filters
+
+    try:
+        query_vector = embed_texts([generated_query])[0]
+        search_data["vectorQueries"] = [{
+            "kind": "vector",
+            "vector": query_vector.tolist(),
+            "fields": "TaskVector",
+            "k": top,
+        }]
+    except Exception as e:
+        st.warning(f"Could not embed the search query, falling back to keyword search: {str(e)}")
+
+    try:
+        response = requests.post(search_url, headers=headers, json=search_data)
+        if response.status_code == 400 and "vectorQueries" in search_data:
+            # The index has no TaskVector field, or it was built with another provider or number of dimensions
+            st.warning(
+                f"Vector search was rejected by the index (embedding provider '{get_embedding_provider().name}'), "
+                f"falling back to keyword search: {response.text}"
+            )
+            del search_data["vectorQueries"]
+            response = requests.post(search_url, headers=headers, json=search_data)
+        if response.status_code == 200:
+            search_results = response.json()
+            # Keyword-only fallback results are not cached, so the next query retries the hybrid search
+            if "vectorQueries" in search_data:
+                store_results(generated_query, top, search_results['value'], filters)
+            return search_results['value']
+        else:
+            st.error(f"Error querying AI Search: {response.status_code} - {response.text}")
+            return None
+    except Exception as e:
+        st.error(f"Error while querying Azure AI Search: {str(e)}")
+        return None
+
+def construct_estimation_prompt(search_results, user_prompt, roles_rates=None):
+    """
+    Constructs a detailed project estimation prompt based on search results and user input.
+    Args:
+        search_results (list): A list of dictionaries containing task details retrieved from a search.
+        user_prompt (str): The user's project description.
+        roles_rates (str): The roles and rates JSON to use. Fetched from the database if not given.
+    Returns:
+        str: A formatted string containing the project estimation prompt, including context, instructions, and task details.
+    The function performs the following steps:
+        1. Formats the search results into a structured string with task details.
+        2. Constructs a detailed project estimation prompt with guidelines for creating new estimated tasks, including:
+            - Timeline for task completion.
+            - Identification of risks, delays, or dependencies.
+            - Estimated price and required resources or roles.
+            - Overall project duration calculation.
+        3. Provides a description of each task attribute and general pointers for creating the estimation.
+        4. Asks for the response in the compact format of `util.estimation_schema` (a column header plus one array per task).
+    Note:
+        - The function ensures the correct profiles and modules are used based on the task descriptions.
+        - EstimatedDays and EstimatedPrice are not requested from the model, they are calculated afterwards by `price_tasks`.
+    """
+    if roles_rates is None:
+        roles_rates = fetch_roles_and_rates()
+    profiles = json.dumps(list(parse_roles_and_rates(roles_rates)))
+
+    tasks = "\n\n".join([
+        f"MSCW: {result['MSCW']}\nArea: {result['Area']}\nModule: {result['Module']}\nFeature: {result['Feature']}\nTask: {result['Task']}\nProfile: {result['Profile']}\nMinDays: {result.get('MinDays', 'N/A')}\nRealDays: {result.get('RealDays', 'N/A')}\nMaxDays: {result.get('MaxDays', 'N/A')}\n% Contingency: {result.get('Contingency', 'N/A')}\nEstimatedDays: {result.get('EstimatedDays', 'N/A')}\nEstimatedPrice: {result.get('EstimatedPrice', 'N/A')}\nPotential Issues: {', '.join(result.get('PotentialIssues', []))}\nOccurrences: {result.get('Occurrences', 1)} (past estimates ranged from {result.get('LowestMinDays', 'N/A')} to {result.get('HighestMaxDays', 'N/A')} days, with {result.get('RealDaysMean', 'N/A')} RealDays on average)" 
+        for result in search_results
+    ])
+    
+    return f"""
+    Context:
+    The user has described their project as follows:
+    {user_prompt}
+
+    The following tasks were retrieved based on the user's project description.
+    Occurrences is how often the task (or a slightly differently worded version of it) appears in past estimations. Tasks that occur often are more reliable references.
+    {tasks}
+
+    Instructions:
+        - Create a detailed project estimation from the user prompt using these tasks.
+        Do not blindly copy the tasks but use them as a guideline to create the new estimated tasks.
+        - For each task:
+            - Provide a clear timeline (in days) for its completion.
+            - Identify any risks, delays, or dependencies that could impact the task.
+            - Include any required resources or roles.
+        - Do NOT calculate EstimatedDays, EstimatedPrice or totals. These are calculated afterwards from MinDays, RealDays, MaxDays and the Profile.
+        - Present the estimation in the JSON format described below.
+
+    Description:
+        1. **MSCW**: The priority of the task. The options are: {format_options(MSCW_OPTIONS)}
+        2. **Area**: The area of the project where the task belongs. The options are: {format_options(AREA_OPTIONS)}
+        3. **Module**: The software engineering domain of the task. The options are: {format_options(MODULE_OPTIONS)}
+        4. **Feature**: What exactly is being done in the task. The options are: {format_options(FEATURE_OPTIONS)}
+        5. **Task**: Summarize the task in a detailed sentence or two.
+        6. **Profile**: The role of the person who will perform the task. The options are the possible Profiles listed below, and you will not deviate from this list of possible profiles. If the profiles have a number at the beginning, you should keep it, for example, "0 Blended FE dev" or "1 Analyst".
+        7. **MinDays**: The estimated minimum number of days required to complete the task.
+        8. **RealDays**: The average or most likely number of days required to complete the task.
+        9. **MaxDays**: The estimated maximum number of days required to complete the task.
+        10. **Potential Issues**: List potential risks or issues that might arise, such as “security concerns,” “data compliance requirements,” or “scope changes.”
+
+    General pointers:
+        - Keep the estimated days low. Anywhere from 0 for MinDays to 4 days for MaxDays is a good estimate.
+        - Make sure that you think about how many tasks there need to be. Don't just copy the amount of tasks from the search_results.
+        - Make sure that the "Task" description contains relevant information from the requirements of the user prompt.
+        - Make sure not to use the same Area for every task. Try to distribute the tasks across different Areas.
+        - Make sure to use a wide variety of Profiles for the tasks. Don't use the same Profile for every task. Make sure to choose the right Profile for the right task (the 'Task' field describes the task).
+        - Make sure to have different MSCW priorities for the tasks.
+        - Make sure to have more "Must Have" and "Should Have" tasks than "Could Have" tasks. The ratio should be 2:1:1 respectively.
+        - Make sure that the tasks are assigned in order of Must Have then Should Have then Could Have.
+        - Make sure that not every task contains "Potential Issues". You may assign them, but only if the possibility of it happening is likely.
+        - Temporary: You should ignore the "Offshore" roles.
+        - The possible Profiles are: {profiles}. You will NOT use any other Profile, regardless of what the search results says.
+        - Make sure to use the correct Profile for the task. The search results may contain incorrect Profiles, so you must choose the correct one based on the task description.
+        - Make sure to use the correct Module for the chosen Profile. If the Profile is "0 Blended MW dev" then the Module should be "Middleware", for example.
+
+
+
+    {compact_format_instructions()}
+    """
+
+def ask_openai_for_estimation(prompt, max_tokens=2000):
+    """
+    Sends a prompt to the OpenAI API and returns the estimated response.
+    Args:
+        prompt (str): The prompt to send to the OpenAI API for estimation.
+        max_tokens (int): The maximum number of tokens in the response.
+    Returns:
+        str: The estimated response from the OpenAI API if the request is successful.
+        None: If there is an error in the request or response.
+    Raises:
+        Exception: If an error occurs during the request to the OpenAI API.
+    """
+    headers = {
+        "Content-Type": "application/json",
+        "api-key": st.secrets["OPENAI_API_KEY"],
+    }
+
+    data = {
+        "messages": [{"role": "user", "content": prompt}],
+        "max_tokens": max_tokens,
+        "temperature": 0.1
+    }
+
+    try:
+        response = requests.post(
+            st.secrets["OPENAI_ENDPOINT"], headers=headers, json=data
+        )
+        if response.status_code == 200:
+            return response.json()["choices"][0]["message"]["content"].strip()
+        else:
+            st.error(f"Error in OpenAI estimation request: {response.json()}")
+            return None
+    except Exception as e:
+        st.error(f"An error occurred during OpenAI estimation request: {str(e)}")
+        return None
+
+def parse_estimation_response(response_json, profiles=None):
+    """
+    Parses the (compact) estimation response and validates every task on its own.
+    Args:
+        response_json (str): The JSON response containing the project estimation.
+        profiles (list): The allowed Profiles.
+    Returns:
+        tuple: One entry per row (the task, or None if the row is invalid) and the invalid rows with their problems,
+               or None if the response is empty, invalid or contains no tasks.
+    """
+    try:
+        # Check if response_json is empty
+        if not response_json:
+            st.error("Received empty response for estimation.")
+            return None
+
+        # Expand the compact rows into tasks
+        tasks, invalid = expand_estimation_response(response_json, profiles)
+
+        # Check if tasks are present
+        if not tasks:
+            st.error("No tasks found in the estimation.")
+            return None
+
+        return tasks, invalid
+
+    except json.JSONDecodeError as e:
+        st.error(f"JSON decoding error: {str(e)}")
+    except Exception as e:
+        st.error(f"Error while parsing estimation response: {str(e)}")
+    return None
+
+def repair_estimation(tasks, invalid, profiles=None):
+    """
+    Asks OpenAI to fix only the invalid rows of an estimation, instead of regenerating the whole estimation.
+    Args:
+        tasks (list): One entry per row, as returned by `parse_estimation_response`.
+        invalid (dict): The invalid rows with their problems.
+        profiles (list): The allowed Profiles.
+    Returns:
+        tuple: The valid tasks, and the number of rows that could not be repaired and were left out.
+    """
+    if invalid:
+        with st.spinner(f"Repairing {len(invalid)} invalid task(s)..."):
+            repair_response = ask_openai_for_estimation(
+                build_repair_prompt(invalid, profiles),
+                max_tokens=150 * len(invalid) + 100,
+            )
+        if repair_response:
+            tasks, invalid = merge_repaired_rows(tasks, invalid, repair_response, profiles)
+    return [task for task in tasks if task is not None], len(invalid)
+
+def run_estimation_pipeline(payload, report_progress=None):
+    """
+    Runs the full estimation pipeline for a job and stores the result in the local estimation store.
+    Args:
+        payload (dict): The job input, with "user_prompt", "project_title" and optionally "pdf_url", "pdf_hash",
+                        "pdf_page_count" and "pdf_content" (the PDF is only analyzed if its content is not given).
+                        PDFs with more than `PAGES_PER_RANGE` pages are analyzed in page ranges.
+        report_progress (callable): Called as report_progress(stage, **partial_results) after every step.
+    Returns:
+        dict: The estimation ID, tasks, search query, search results, prompt and the number of dropped tasks.
+    Raises:
+        RuntimeError: If a step of the pipeline fails.
+    """
+    report = report_progress or (lambda stage, **partial_results: None)
+    user_prompt = payload.get("user_prompt", "")
+    pdf_content = payload.get("pdf_content")
+
+    if payload.get("pdf_url") and not pdf_content:
+        page_count = payload.get("pdf_page_count")
+        if payload.get("pdf_hash") and page_count and page_count > PAGES_PER_RANGE:
+            report(f"Analyzing PDF ({page_count} pages)")
+            pdf_content = analyze_pdf_in_page_ranges(payload["pdf_url"], payload["pdf_hash"], page_count)
+        else:
+            report("Analyzing PDF")
+            pdf_content = analyze_pdf(payload["pdf_url"], is_url=True)
+        if not pdf_content:
+            raise RuntimeError("The PDF could not be analyzed.")
+
+    report("Generating query", pdf_content=pdf_content)
+    search_query = generate_search_query(user_prompt, pdf_content=pdf_content)
+    if not search_query:
+        raise RuntimeError("The search query could not be generated.")
+
+    report("Querying Azure AI Search", search_query=search_query)
+    search_results = query_azure_ai_search(search_query)
+    if not search_results:
+        raise RuntimeError("Azure AI Search returned no results.")
+
+    report("Generating project estimation", search_results=search_results)
+    roles_rates = fetch_roles_and_rates()
+    profiles = list(parse_roles_and_rates(roles_rates)) or None
+    estimation_prompt = construct_estimation_prompt(search_results, user_prompt, roles_rates)
+    ai_response = ask_openai_for_estimation(estimation_prompt)
+    if not ai_response:
+        raise RuntimeError("No response from OpenAI for estimation.")
+
+    parsed = parse_estimation_response(ai_response, profiles)
+    if not parsed:
+        raise RuntimeError("The estimation response could not be parsed.")
+    if parsed[1]:
+        report(f"Repairing {len(parsed[1])} invalid task(s)")
+    tasks, dropped_tasks = repair_estimation(*parsed, profiles)
+    if not tasks:
+        raise RuntimeError("No valid tasks found in the estimation.")
+
+    # EstimatedDays and EstimatedPrice are calculated locally instead of by the model
+    tasks = price_tasks(tasks, roles_rates).to_dict(orient="records")
+    estimation_id = save_estimation(
+        payload.get("project_title") or "Untitled project",
+        tasks,
+        prompt=estimation_prompt,
+        search_query=search_query,
+        search_results=search_results,
+        roles_rates=roles_rates,
+        user_prompt=user_prompt,
+        pdf_hash=payload.get("pdf_hash"),
+        pdf_content=pdf_content,
+    )
+    return {
+        "estimationId": estimation_id,
+        "tasks": tasks,
+        "searchQuery": search_query,
+        "searchResults": search_results,
+        "prompt": estimation_prompt,
+        "droppedTasks": dropped_tasks,
+    }
+#endregion
@@ -0,0 +1,144 @@
+import json
+import numpy as np
+import pandas as pd
+
+
+# Blended profiles that only make sense for one Module
+PROFILE_MODULES = {
+    "0 Blended FE dev": "Frontend",
+    "0 Blended MW dev": "Middleware",
+    "0 Blended Overall dev": "Overall",
+}
+
+# Column order of a priced estimation
+TASK_COLUMNS = [
+    "MSCW", "Area", "Module", "Feature", "Task", "Profile", "MinDays", "RealDays", "MaxDays",
+    "% Contingency", "EstimatedDays", "EstimatedPrice", "ContingencyPrice", "Potential Issues", "Issues",
+]
+
+
+def parse_roles_and_rates(roles_rates):
+    """
+    Converts the roles and rates returned by `fetch_roles_and_rates` to a dictionary.
+
+    Args:
+        roles_rates (str | dict): The roles and rates as a JSON string or dictionary.
+
+    Returns:
+        dict: The daily rate (float) of every role.
+    """
+    if isinstance(roles_rates, str):
+        roles_rates = json.loads(roles_rates or "{}")
+    return {role: float(rate) for role, rate in roles_rates.items()}
+
+
+def parse_contingency(values):
+    """
+    Converts contingency values such as "10%", "0.5%", "10" or 0.1 to fractions.
+    Values with a "%" sign are always percentages. Bare numbers above 1 are percentages, and bare numbers up to 1
+    are already fractions.
+
+    Args:
+        values (pd.Series): The contingency values.
+
+    Returns:
+        pd.Series: The contingency as a fraction between 0 and 1.
+    """
+    text = values.astype(str).str.strip()
+    is_percentage = text.str.endswith("%")
+    numbers = pd.to_numeric(text.str.rstrip("%").str.strip(), errors="coerce").fillna(0.0)
+    return numbers.where(~is_percentage & (numbers <= 1), numbers / 100)
+
+
+def price_tasks(tasks, roles_rates, contingency=None):
+    """
+    Computes EstimatedDays, EstimatedPrice and the contingency of every task locally, and validates the
+    Profile and Module of every task.
+
+    EstimatedDays is the average of MinDays, RealDays and MaxDays, rounded down if it is greater than RealDays
+    and up otherwise, and kept between MinDays and MaxDays (rounded to whole days). EstimatedPrice is EstimatedDays times the daily rate
+    of the Profile, or half the daily rate if EstimatedDays is 0.
+
+    Args:
+        tasks (list | pd.DataFrame): The estimated tasks, with at least Profile, MinDays, RealDays and MaxDays.
+        roles_rates (str | dict): The roles and their daily rates.
+        contingency (str | float): Contingency to apply to every task. Defaults to the "% Contingency" of the task, or 0.
+
+    Returns:
+        pd.DataFrame: The priced tasks. Problems found during validation are listed in the "Issues" column.
+    """
+    rates = parse_roles_and_rates(roles_rates)
+    df = pd.DataFrame(tasks).copy()
+
+    for field in ["MSCW", "Area", "Module", "Feature", "Task", "Profile", "Potential Issues"]:
+        if field not in df.columns:
+            df[field] = ""
+        df[field] = df[field].fillna("").astype(str)
+
+    days = {}
+    for field in ["MinDays", "RealDays", "MaxDays"]:
+        values = df[field] if field in df.columns else pd.Series(np.nan, index=df.index)
+        days[field] = pd.to_numeric(values, errors="coerce")
+    min_days = days["MinDays"].fillna(0).clip(lower=0)
+    real_days = days["RealDays"].fillna(min_days).clip(lower=0)
+    max_days = np.maximum(days["MaxDays"].fillna(real_days), min_days)
+
+    average = (min_days + real_days + max_days) / 3
+    estimated_days = np.where(average > real_days, np.floor(average), np.ceil(average))
+    # Clip to whole-day bounds, so EstimatedDays stays an integer when MinDays or MaxDays are fractional
+    lower_bound = np.ceil(min_days)
+    upper_bound = np.maximum(np.floor(max_days), lower_bound)
+    estimated_days = np.clip(estimated_days, lower_bound, upper_bound).astype(int)
+
+    rate = df["Profile"].map(rates)
+    estimated_price = np.where(estimated_days == 0, rate / 2, estimated_days * rate)
+
+    if contingency is None:
+        contingency_values = df["% Contingency"] if "% Contingency" in df.columns else pd.Series("0", index=df.index)
+    else:
+        contingency_values = pd.Series(contingency, index=df.index)
+    contingency_fraction = parse_contingency(contingency_values)
+
+    df["MinDays"] = min_days
+    df["RealDays"] = real_days
+    df["MaxDays"] = max_days
+    df["% Contingency"] = (contingency_fraction * 100).round(2).map(lambda x: f"{x:g}%")
+    df["EstimatedDays"] = estimated_days
+    df["EstimatedPrice"] = np.round(estimated_price, 2)
+    df["ContingencyPrice"] = np.round(estimated_price * contingency_fraction, 2)
+
+    # Validation
+    expected_module = df["Profile"].map(PROFILE_MODULES)
+    wrong_module = expected_module.notna() & (expected_module != df["Module"])
+    invalid_days = days["MinDays"].isna() | days["RealDays"].isna() | days["MaxDays"].isna() \
+        | (days["RealDays"] < days["MinDays"]) | (days["MaxDays"] < days["RealDays"])
+    issues = pd.DataFrame({
+        "profile": np.where(rate.isna(), "Profile not in rates table", ""),
+        "module": np.where(wrong_module, "Module should be '" + expected_module.fillna("") + "' for this Profile", ""),
+        "days": np.where(invalid_days, "MinDays <= RealDays <= MaxDays does not hold", ""),
+    }, index=df.index)
+    df["Issues"] = issues.apply(lambda row: "; ".join(issue for issue in row if issue), axis=1) if len(df) else ""
+
+    columns = TASK_COLUMNS + [column for column in df.columns if column not in TASK_COLUMNS]
+    return df[columns]
+
+
+def estimation_totals(df):
+    """
+    Computes the totals of a priced estimation.
+
+    Args:
+        df (pd.DataFrame): The priced tasks, as returned by `price_tasks`.
+
+    Returns:
+        dict: The number of tasks, total days, total price, total contingency and total price including contingency.
+    """
+    total_price = float(df["EstimatedPrice"].sum()) if "EstimatedPrice" in df.columns else 0.0
+    total_contingency = float(df["ContingencyPrice"].sum()) if "ContingencyPrice" in df.columns else 0.0
+    return {
+        "Tasks": int(len(df)),
+        "EstimatedDays": float(df["EstimatedDays"].sum()) if "EstimatedDays" in df.columns else 0.0,
+        "EstimatedPrice": round(total_price, 2),
+        "ContingencyPrice": round(total_contingency, 2),
+        "TotalPrice": round(total_price + total_contingency, 2),
+    }
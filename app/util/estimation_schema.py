@@ -0,0 +1,245 @@
+"""
+Compact output format for estimations.
+
+Instead of repeating every key for every task, the model returns one header and one array per task:
+
+    {"columns": ["MSCW", "Area", ...], "rows": [["1 Must Have", "03 Setup", ...], ...]}
+
+`expand_estimation_response` turns this back into the usual task dictionaries and validates every row on its own,
+so only the invalid rows have to be sent back to the model (see `build_repair_prompt`).
+"""
+
+import re
+import json
+
+
+MSCW_OPTIONS = ["1 Must Have", "2 Should Have", "3 Could Have"]
+AREA_OPTIONS = ["01 Analyze & Design", "03 Setup", "04 Development"]
+MODULE_OPTIONS = ["Overall", "Frontend", "Middleware", "Infra", "IoT", "Security"]
+FEATURE_OPTIONS = [
+    "General", "Technical Lead", "Project Manager", "Sprint Artifacts & Meetings", "Technical Analysis",
+    "Functional Analysis", "User Experience (UX)", "User Interface (UI)", "Security Review", "Go-Live support",
+    "Setup Environment + Azure", "Setup Projects", "Authentication & Authorizations", "Monitoring", "Notifications",
+    "Settings", "Filtering / search",
+]
+
+# Fields the model has to fill in, in the order of the compact rows
+ESTIMATION_COLUMNS = [
+    "MSCW", "Area", "Module", "Feature", "Task", "Profile", "MinDays", "RealDays", "MaxDays", "Potential Issues",
+]
+
+EXAMPLE_ROW = [
+    "1 Must Have", "01 Analyze & Design", "Frontend", "Technical Analysis",
+    "Analysis of the design requirements for the client", "0 Blended FE dev", 1, 2, 2,
+    "We might need to consult with the client for additional requirements",
+]
+
+
+def format_options(options):
+    """
+    Formats a list of options the way they are listed in the prompts.
+
+    Args:
+        options (list): The options.
+
+    Returns:
+        str: The quoted options, separated by commas.
+    """
+    return ", ".join(f'"{option}"' for option in options)
+
+
+def compact_format_instructions():
+    """
+    Returns the part of a prompt that describes the compact output format.
+
+    Returns:
+        str: The format instructions, including an example.
+    """
+    example = json.dumps({"columns": ESTIMATION_COLUMNS, "rows": [EXAMPLE_ROW]}, ensure_ascii=False)
+    return f"""Return your response as a single JSON object with a "columns" header and one array per task in "rows".
+    Every row has exactly {len(ESTIMATION_COLUMNS)} values, in the order of the columns. Use "" if a task has no Potential Issues.
+    Do not add any text outside the JSON object. For example:
+    {example}"""
+
+
+def _extract_json(response_text):
+    # Models sometimes wrap the JSON in a Markdown code block or add a sentence around it
+    try:
+        return json.loads(response_text)
+    except json.JSONDecodeError:
+        match = re.search(r"\{.*\}", response_text, re.DOTALL)
+        if not match:
+            raise
+        return json.loads(match.group(0))
+
+
+def validate_task(task, profiles=None):
+    """
+    Validates a single estimated task.
+
+    Args:
+        task (dict): The task.
+        profiles (iterable): The allowed Profiles. The Profile is not checked if this is not given.
+
+    Returns:
+        list: A description of every problem with the task. Empty if the task is valid.
+    """
+    errors = []
+    for field, options in [("MSCW", MSCW_OPTIONS), ("Area", AREA_OPTIONS), ("Module", MODULE_OPTIONS)]:
+        if task.get(field) not in options:
+            errors.append(f"{field} must be one of {format_options(options)}")
+    if not str(task.get("Task", "")).strip():
+        errors.append("Task must not be empty")
+    if profiles is not None and task.get("Profile") not in set(profiles):
+        errors.append("Profile must be one of the possible Profiles")
+
+    days = []
+    for field in ["MinDays", "RealDays", "MaxDays"]:
+        value = task.get(field)
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+            errors.append(f"{field} must be a number of at least 0")
+        else:
+            days.append(value)
+    if len(days) == 3 and not days[0] <= days[1] <= days[2]:
+        errors.append("MinDays <= RealDays <= MaxDays must hold")
+    return errors
+
+
+def _row_to_task(row, columns):
+    if isinstance(row, dict):
+        return {column: row.get(column, "") for column in ESTIMATION_COLUMNS}, []
+    if not isinstance(row, list):
+        return None, ["Row must be an array of values"]
+    # The optional Potential Issues may be left out of a row
+    required_columns = [column for column in columns if column != "Potential Issues"]
+    if len(row) == len(columns):
+        task = dict(zip(columns, row))
+    elif len(row) == len(required_columns):
+        task = dict(zip(required_columns, row))
+    else:
+        return None, [f"Row must have exactly {len(columns)} values"]
+    task.setdefault("Potential Issues", "")
+    return task, []
+
+
+def _in_column_order(row, columns):
+    # Invalid rows are sent back to the model in the order of ESTIMATION_COLUMNS, whatever order the response used
+    if not isinstance(row, list) or columns == ESTIMATION_COLUMNS:
+        return row
+    required_columns = [column for column in columns if column != "Potential Issues"]
+    for row_columns in (columns, required_columns):
+        if len(row) == len(row_columns):
+            values = dict(zip(row_columns, row))
+            return [values.get(column, "") for column in ESTIMATION_COLUMNS]
+    return row
+
+
+def expand_estimation_response(response_text, profiles=None):
+    """
+    Expands a compact estimation response into task dictionaries and validates every task.
+
+    The previous format, {"tasks": [{...}, ...]}, is accepted as well.
+
+    Args:
+        response_text (str): The response of the model.
+        profiles (iterable): The allowed Profiles.
+
+    Returns:
+        tuple: A list with one entry per row (the task dictionary, or None if the row is invalid), and a dictionary
+               mapping the position of every invalid row to a tuple of the raw row and its problems.
+
+    Raises:
+        json.JSONDecodeError: If the response does not contain a JSON object.
+        ValueError: If the JSON object has neither "rows" nor "tasks", or they are not arrays.
+    """
+    data = _extract_json(response_text)
+    if not isinstance(data, dict):
+        raise ValueError("The response is not a JSON object.")
+    if "rows" in data:
+        columns = data.get("columns") or ESTIMATION_COLUMNS
+        if not isinstance(columns, list):
+            raise ValueError("The columns of the response must be an array.")
+        missing = [column for column in ESTIMATION_COLUMNS if column not in columns and column != "Potential Issues"]
+        if missing:
+            raise ValueError(f"Columns missing from the response: {', '.join(missing)}")
+        rows = data["rows"]
+    elif "tasks" in data:
+        columns = ESTIMATION_COLUMNS
+        rows = data["tasks"]
+    else:
+        raise ValueError("The response contains no rows.")
+    if not isinstance(rows, list):
+        raise ValueError("The rows of the response must be an array.")
+
+    tasks = []
+    invalid = {}
+    for position, row in enumerate(rows):
+        task, errors = _row_to_task(row, columns)
+        if task is not None:
+            errors = validate_task(task, profiles)
+        if errors:
+            tasks.append(None)
+            invalid[position] = (_in_column_order(row, columns), errors)
+        else:
+            tasks.append(task)
+    return tasks, invalid
+
+
+def build_repair_prompt(invalid, profiles=None):
+    """
+    Builds a prompt that asks the model to fix only the invalid rows of an estimation.
+
+    Args:
+        invalid (dict): The invalid rows, as returned by `expand_estimation_response`, in the order of ESTIMATION_COLUMNS.
+        profiles (iterable): The allowed Profiles.
+
+    Returns:
+        str: The repair prompt. The model answers in the compact format, with the fixed rows in the same order.
+    """
+    rows = "\n    ".join(
+        f"{number}. {json.dumps(row, ensure_ascii=False)}\n       Problems: {'; '.join(errors)}"
+        for number, (row, errors) in enumerate(invalid.values(), start=1)
+    )
+    profile_line = f"\n    - Profile: {format_options(profiles)}" if profiles is not None else ""
+    return f"""
+    The following rows of a project estimation are invalid. The columns are: {json.dumps(ESTIMATION_COLUMNS)}
+
+    {rows}
+
+    Fix every row, keeping its meaning. The allowed values are:
+    - MSCW: {format_options(MSCW_OPTIONS)}
+    - Area: {format_options(AREA_OPTIONS)}
+    - Module: {format_options(MODULE_OPTIONS)}{profile_line}
+    - MinDays, RealDays and MaxDays are numbers with MinDays <= RealDays <= MaxDays.
+
+    Return exactly {len(invalid)} rows, in the same order.
+    {compact_format_instructions()}
+    """
+
+
+def merge_repaired_rows(tasks, invalid, repair_response, profiles=None):
+    """
+    Fills in the rows that were fixed by the model.
+
+    Args:
+        tasks (list): The tasks, as returned by `expand_estimation_response`.
+        invalid (dict): The invalid rows, as returned by `expand_estimation_response`.
+        repair_response (str): The response of the model to the repair prompt.
+        profiles (iterable): The allowed Profiles.
+
+    Returns:
+        tuple: The updated tasks, and the rows that are still invalid (in the same form as `invalid`).
+    """
+    tasks = list(tasks)
+    try:
+        repaired, _ = expand_estimation_response(repair_response, profiles)
+    except (json.JSONDecodeError, ValueError):
+        return tasks, invalid
+
+    still_invalid = {}
+    for position, repaired_task in zip(invalid, repaired + [None] * (len(invalid) - len(repaired))):
+        if repaired_task is not None:
+            tasks[position] = repaired_task
+        else:
+            still_invalid[position] = invalid[position]
+    return tasks, still_invalid
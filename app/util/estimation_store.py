@@ -0,0 +1,201 @@
+import os
+import json
+import sqlite3
+import hashlib
+import pandas as pd
+import streamlit as st
+
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+ESTIMATION_STORE_PATH = os.getenv("ESTIMATION_STORE_PATH", os.path.join(DATA_DIR, "estimations.db"))
+
+
+def compute_hash(data):
+    """
+    Computes the SHA-256 hash of the given bytes or string.
+
+    Args:
+        data (bytes | str): The content to hash.
+
+    Returns:
+        str: The hexadecimal SHA-256 digest.
+    """
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+def compute_file_hash(file, chunk_size=1024 * 1024):
+    """
+    Computes the SHA-256 hash of a file-like object, reading it in chunks instead of all at once.
+
+    Args:
+        file (file-like): The file to hash. It is rewound before and after hashing.
+        chunk_size (int): The number of bytes read at a time.
+
+    Returns:
+        str: The hexadecimal SHA-256 digest.
+    """
+    hasher = hashlib.sha256()
+    file.seek(0)
+    for chunk in iter(lambda: file.read(chunk_size), b""):
+        hasher.update(chunk)
+    file.seek(0)
+    return hasher.hexdigest()
+
+
+def create_store_connection():
+    """
+    Opens the local SQLite estimation store, creating the table and its indexes if they do not exist yet.
+
+    Returns:
+        sqlite3.Connection: A connection to the estimation store.
+    """
+    os.makedirs(os.path.dirname(ESTIMATION_STORE_PATH), exist_ok=True)
+    connection = sqlite3.connect(ESTIMATION_STORE_PATH)
+    connection.row_factory = sqlite3.Row
+    connection.executescript(
+        """
+        CREATE TABLE IF NOT EXISTS estimations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            projectTitle TEXT NOT NULL,
+            createdAt TEXT NOT NULL,
+            pdfHash TEXT,
+            ratesVersion TEXT,
+            userPrompt TEXT,
+            pdfContent TEXT,
+            searchQuery TEXT,
+            searchResults TEXT,
+            prompt TEXT,
+            tasks TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_estimations_pdf_hash ON estimations (pdfHash);
+        CREATE INDEX IF NOT EXISTS idx_estimations_project_title ON estimations (projectTitle);
+        CREATE INDEX IF NOT EXISTS idx_estimations_created_at ON estimations (createdAt);
+        """
+    )
+    return connection
+
+
+def save_estimation(project_title, tasks, prompt=None, search_query=None, search_results=None,
+                    roles_rates=None, user_prompt=None, pdf_hash=None, pdf_content=None):
+    """
+    Stores an estimation result in the local estimation store.
+
+    Args:
+        project_title (str): The title of the estimated project.
+        tasks (list): The estimated tasks.
+        prompt (str): The estimation prompt that was sent to OpenAI.
+        search_query (str): The generated search query.
+        search_results (list): The tasks retrieved from Azure AI Search.
+        roles_rates (str): The roles and rates JSON used for the estimation. Its hash is stored as the rates version.
+        user_prompt (str): The additional requirements entered by the user.
+        pdf_hash (str): The SHA-256 hash of the uploaded PDF, if any.
+        pdf_content (str): The text extracted from the uploaded PDF, if any.
+
+    Returns:
+        int: The ID of the stored estimation, or None if an error occurs.
+    """
+    try:
+        connection = create_store_connection()
+        with connection:
+            cursor = connection.execute(
+                """
+                INSERT INTO estimations (projectTitle, createdAt, pdfHash, ratesVersion, userPrompt,
+                                         pdfContent, searchQuery, searchResults, prompt, tasks)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    project_title,
+                    pd.Timestamp.now().strftime('%Y-%m-%d %H:%M:%S'),
+                    pdf_hash,
+                    compute_hash(roles_rates)[:12] if roles_rates else None,
+                    user_prompt,
+                    pdf_content,
+                    search_query,
+                    json.dumps(search_results or []),
+                    prompt,
+                    json.dumps(tasks),
+                ),
+            )
+        connection.close()
+        return cursor.lastrowid
+    except sqlite3.Error as e:
+        st.error(f"Failed to store estimation: {e}")
+        return None
+
+
+def fetch_estimations(project_title=None):
+    """
+    Fetches an overview of the stored estimations, newest first.
+
+    Args:
+        project_title (str): Only return estimations for this project title, if given.
+
+    Returns:
+        pd.DataFrame: A DataFrame with the id, project title, creation date, PDF hash and rates version of every estimation.
+                      If an error occurs, an empty DataFrame is returned.
+    """
+    try:
+        connection = create_store_connection()
+        query = "SELECT id, projectTitle, createdAt, pdfHash, ratesVersion FROM estimations"
+        params = ()
+        if project_title:
+            query += " WHERE projectTitle = ?"
+            params = (project_title,)
+        df = pd.read_sql(query + " ORDER BY createdAt DESC, id DESC", connection, params=params)
+        connection.close()
+        return df
+    except sqlite3.Error as e:
+        st.error(f"Failed to fetch estimations: {e}")
+    return pd.DataFrame()
+
+
+def _row_to_estimation(row):
+    estimation = dict(row)
+    estimation["tasks"] = json.loads(estimation["tasks"])
+    estimation["searchResults"] = json.loads(estimation["searchResults"] or "[]")
+    return estimation
+
+
+def load_estimation(estimation_id):
+    """
+    Loads a stored estimation by its ID.
+
+    Args:
+        estimation_id (int): The ID of the estimation.
+
+    Returns:
+        dict: The stored estimation with its tasks and search results decoded, or None if it does not exist.
+    """
+    try:
+        connection = create_store_connection()
+        row = connection.execute("SELECT * FROM estimations WHERE id = ?", (int(estimation_id),)).fetchone()
+        connection.close()
+        return _row_to_estimation(row) if row else None
+    except sqlite3.Error as e:
+        st.error(f"Failed to load estimation: {e}")
+        return None
+
+
+def find_estimation_by_pdf_hash(pdf_hash):
+    """
+    Finds the most recent estimation that was made for a PDF with the given hash.
+
+    Args:
+        pdf_hash (str): The SHA-256 hash of the PDF.
+
+    Returns:
+        dict: The most recent matching estimation, or None if the PDF has not been estimated before.
+    """
+    try:
+        connection = create_store_connection()
+        row = connection.execute(
+            "SELECT * FROM estimations WHERE pdfHash = ? ORDER BY createdAt DESC, id DESC LIMIT 1",
+            (pdf_hash,),
+        ).fetchone()
+        connection.close()
+        return _row_to_estimation(row) if row else None
+    except sqlite3.Error as e:
+        st.error(f"Failed to look up estimation: {e}")
+        return None
@@ -0,0 +1,158 @@
+"""
+Local record of the state of the search index, published by `build_knowledge_base.py` when a build finishes.
+
+Every build gets a new index version. Caches of search results are stamped with this version, so a rebuild
+invalidates them immediately.
+
+The state also holds the name of the active index. Every build creates a new index named after its version
+(blue/green), and only points the app at it once it is complete, so searches keep working during a rebuild.
+The previous indexes are recorded as retired, and are deleted by the next build after a grace period.
+"""
+
+import os
+import json
+import uuid
+import pandas as pd
+
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+INDEX_STATE_PATH = os.getenv("INDEX_STATE_PATH", os.path.join(DATA_DIR, "index_state.json"))
+
+_cached_state = {"mtime": None, "state": {}}
+
+
+def read_index_state():
+    """
+    Reads the published index state. The file is only read again when it changed on disk.
+
+    Returns:
+        dict: The index state, or an empty dict if no build has published a version yet.
+    """
+    try:
+        mtime = os.stat(INDEX_STATE_PATH).st_mtime_ns
+    except FileNotFoundError:
+        return {}
+
+    if _cached_state["mtime"] != mtime:
+        with open(INDEX_STATE_PATH, "r") as state_file:
+            _cached_state["state"] = json.load(state_file)
+        _cached_state["mtime"] = mtime
+    return _cached_state["state"]
+
+
+def write_index_state(state):
+    """
+    Atomically replaces the published index state.
+
+    Args:
+        state (dict): The new index state.
+
+    Returns:
+        None
+    """
+    os.makedirs(os.path.dirname(INDEX_STATE_PATH), exist_ok=True)
+    tmp_path = INDEX_STATE_PATH + ".tmp"
+    with open(tmp_path, "w") as state_file:
+        json.dump(state, state_file, indent=2)
+    os.replace(tmp_path, INDEX_STATE_PATH)
+
+
+def new_index_version():
+    """
+    Generates a new, unique index version. It only contains lowercase letters, digits and dashes,
+    so it can be used in an index name.
+
+    Returns:
+        str: The new index version.
+    """
+    return f"{pd.Timestamp.now().strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+
+
+def publish_index_version(index_name, document_count, version=None):
+    """
+    Publishes a new index version, and makes `index_name` the active index. Call this when a build of the index
+    has finished. If the active index changes, the previous one is recorded as retired.
+
+    Args:
+        index_name (str): The name of the index that was built.
+        document_count (int): The number of documents in the index.
+        version (str): The version of the build. A new version is generated if not given.
+
+    Returns:
+        str: The new index version.
+    """
+    version = version or new_index_version()
+    state = dict(read_index_state())
+    retired_indexes = list(state.get("retiredIndexes", []))
+    if state.get("indexName") and state["indexName"] != index_name:
+        retired_indexes.append({
+            "indexName": state["indexName"],
+            "retiredAt": pd.Timestamp.now().strftime('%Y-%m-%d %H:%M:%S'),
+        })
+    state.update({
+        "version": version,
+        "indexName": index_name,
+        "documentCount": document_count,
+        "publishedAt": pd.Timestamp.now().strftime('%Y-%m-%d %H:%M:%S'),
+        "retiredIndexes": [retired for retired in retired_indexes if retired["indexName"] != index_name],
+    })
+    write_index_state(state)
+    return version
+
+
+def get_index_version():
+    """
+    Returns the current index version.
+
+    Returns:
+        str: The index version, or None if no build has published a version yet.
+    """
+    return read_index_state().get("version")
+
+
+def get_active_index_name(default=None):
+    """
+    Returns the name of the active index, as published by the last build.
+
+    Args:
+        default (str): The name to return if no build has published an index yet.
+
+    Returns:
+        str: The name of the active index.
+    """
+    return read_index_state().get("indexName") or default
+
+
+def get_expired_indexes(grace_period_hours):
+    """
+    Returns the retired indexes whose grace period has passed.
+
+    Args:
+        grace_period_hours (float): How long a retired index is kept, in hours.
+
+    Returns:
+        list: The names of the expired indexes.
+    """
+    expires_before = pd.Timestamp.now() - pd.Timedelta(hours=grace_period_hours)
+    return [
+        retired["indexName"]
+        for retired in read_index_state().get("retiredIndexes", [])
+        if pd.Timestamp(retired["retiredAt"]) < expires_before
+    ]
+
+
+def forget_retired_indexes(index_names):
+    """
+    Removes retired indexes from the index state, after they were deleted.
+
+    Args:
+        index_names (list): The names of the deleted indexes.
+
+    Returns:
+        None
+    """
+    state = dict(read_index_state())
+    state["retiredIndexes"] = [
+        retired for retired in state.get("retiredIndexes", []) if retired["indexName"] not in set(index_names)
+    ]
+    write_index_state(state)
@@ -0,0 +1,202 @@
+"""
+Local columnar (Arrow IPC) snapshots of the knowledge-base spreadsheets.
+
+`build_knowledge_base.py` stores the normalized tasks of every Excel blob in its own snapshot file, keyed by the
+blob's etag. Later builds only download and parse blobs whose etag changed, and anything that needs the knowledge
+base locally can read the snapshots through `load_knowledge_base()` without touching Azure Blob Storage.
+"""
+
+import os
+import json
+import hashlib
+import pandas as pd
+import pyarrow as pa
+
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+SNAPSHOT_DIR = os.getenv("KNOWLEDGE_BASE_SNAPSHOT_DIR", os.path.join(DATA_DIR, "knowledge_base"))
+MANIFEST_PATH = os.path.join(SNAPSHOT_DIR, "manifest.json")
+
+# Normalized task columns and their default values, in the order they are stored
+TASK_COLUMNS = {
+    "Task": "",
+    "MSCW": "",
+    "Area": "",
+    "Module": "",
+    "Feature": "",
+    "Profile": "",
+    "MinDays": 0,
+    "RealDays": 0,
+    "MaxDays": 0,
+    "Contingency": "0",
+    "EstimatedDays": 0,
+    "EstimatedPrice": 0.0,
+    "PotentialIssues": "",
+}
+
+
+def read_manifest():
+    """
+    Reads the snapshot manifest, which maps every blob name to its etag and snapshot file.
+
+    Returns:
+        dict: The manifest, or an empty dict if no snapshots have been written yet.
+    """
+    if not os.path.exists(MANIFEST_PATH):
+        return {}
+    with open(MANIFEST_PATH, "r") as manifest_file:
+        return json.load(manifest_file)
+
+
+def _write_manifest(manifest):
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    tmp_path = MANIFEST_PATH + ".tmp"
+    with open(tmp_path, "w") as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+    os.replace(tmp_path, MANIFEST_PATH)
+
+
+def _snapshot_path(blob_name):
+    # Blob names can contain folders and characters that are not valid in file names
+    file_name = hashlib.sha1(blob_name.encode("utf-8")).hexdigest() + ".arrow"
+    return os.path.join(SNAPSHOT_DIR, file_name)
+
+
+def write_snapshot(blob_name, etag, df):
+    """
+    Writes the normalized tasks of a blob to an Arrow IPC snapshot and records its etag in the manifest.
+
+    Args:
+        blob_name (str): The name of the Excel blob.
+        etag (str): The etag of the blob the tasks were parsed from.
+        df (pd.DataFrame): The normalized tasks, as returned by `excel_to_dataframe`, or None if the blob has no
+                           valid sheet. Then only the etag is recorded, so the blob is not parsed again until it changes.
+
+    Returns:
+        None
+    """
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    path = _snapshot_path(blob_name)
+    if df is None:
+        if os.path.exists(path):
+            os.remove(path)
+        manifest = read_manifest()
+        manifest[blob_name] = {"etag": etag, "file": None, "rows": 0}
+        _write_manifest(manifest)
+        return
+    table = pa.Table.from_pandas(df, preserve_index=False)
+
+    tmp_path = path + ".tmp"
+    with pa.OSFile(tmp_path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, path)
+
+    manifest = read_manifest()
+    manifest[blob_name] = {"etag": etag, "file": os.path.basename(path), "rows": table.num_rows}
+    _write_manifest(manifest)
+
+
+def has_snapshot(blob_name, etag=None):
+    """
+    Checks whether a blob has a snapshot, including the etag-only record of a blob without a valid sheet.
+
+    Args:
+        blob_name (str): The name of the Excel blob.
+        etag (str): The current etag of the blob. If given, the snapshot has to be made from this etag.
+
+    Returns:
+        bool: True if there is an (up-to-date) snapshot for the blob.
+    """
+    entry = read_manifest().get(blob_name)
+    if not entry or (etag is not None and entry["etag"] != etag):
+        return False
+    return entry["file"] is None or os.path.exists(os.path.join(SNAPSHOT_DIR, entry["file"]))
+
+
+def read_snapshot_table(blob_name, etag=None):
+    """
+    Reads the snapshot of a blob as a memory-mapped Arrow table.
+
+    Args:
+        blob_name (str): The name of the Excel blob.
+        etag (str): The current etag of the blob. If given, the snapshot is only returned when it was made from this etag.
+
+    Returns:
+        pa.Table: The snapshot, or None if there is no (up-to-date) snapshot for the blob, or the blob has no valid sheet.
+    """
+    entry = read_manifest().get(blob_name)
+    if not entry or entry["file"] is None or (etag is not None and entry["etag"] != etag):
+        return None
+
+    path = os.path.join(SNAPSHOT_DIR, entry["file"])
+    if not os.path.exists(path):
+        return None
+    return pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+
+
+def read_snapshot(blob_name, etag=None):
+    """
+    Reads the snapshot of a blob as a DataFrame.
+
+    Args:
+        blob_name (str): The name of the Excel blob.
+        etag (str): The current etag of the blob. If given, the snapshot is only returned when it was made from this etag.
+
+    Returns:
+        pd.DataFrame: The normalized tasks, or None if there is no (up-to-date) snapshot for the blob,
+                      or the blob has no valid sheet.
+    """
+    table = read_snapshot_table(blob_name, etag)
+    return table.to_pandas() if table is not None else None
+
+
+def prune_snapshots(blob_names):
+    """
+    Removes the snapshots of blobs that are no longer in the knowledge-base container.
+
+    Args:
+        blob_names (iterable): The names of the blobs that still exist.
+
+    Returns:
+        list: The names of the blobs whose snapshots were removed.
+    """
+    manifest = read_manifest()
+    removed = [name for name in manifest if name not in set(blob_names)]
+    for name in removed:
+        file_name = manifest.pop(name)["file"]
+        if file_name is not None and os.path.exists(os.path.join(SNAPSHOT_DIR, file_name)):
+            os.remove(os.path.join(SNAPSHOT_DIR, file_name))
+    if removed:
+        _write_manifest(manifest)
+    return removed
+
+
+def load_knowledge_base_table():
+    """
+    Loads all snapshots as one memory-mapped Arrow table, with the source blob name in a `Source` column.
+
+    Returns:
+        pa.Table: All knowledge-base tasks, or None if no snapshots exist.
+    """
+    tables = []
+    for blob_name in sorted(read_manifest()):
+        table = read_snapshot_table(blob_name)
+        if table is not None and table.num_rows:
+            tables.append(table.append_column("Source", pa.array([blob_name] * table.num_rows, pa.string())))
+    if not tables:
+        return None
+    return pa.concat_tables(tables, promote_options="default")
+
+
+def load_knowledge_base():
+    """
+    Loads all snapshots as one DataFrame, with the source blob name in a `Source` column.
+
+    Returns:
+        pd.DataFrame: All knowledge-base tasks, or an empty DataFrame if no snapshots exist.
+    """
+    table = load_knowledge_base_table()
+    if table is None:
+        return pd.DataFrame(columns=list(TASK_COLUMNS) + ["Source"])
+    return table.to_pandas()
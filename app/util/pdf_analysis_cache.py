@@ -0,0 +1,68 @@
+"""
+Cache of Document Intelligence results per PDF page range.
+
+Long PDFs are analyzed in page ranges (see `analyze_pdf_in_page_ranges`). Every range that succeeds is cached here,
+keyed by the hash of the PDF and the range, so a re-run only analyzes the ranges that failed.
+"""
+
+import os
+import sqlite3
+import pandas as pd
+
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+PDF_ANALYSIS_CACHE_PATH = os.getenv("PDF_ANALYSIS_CACHE_PATH", os.path.join(DATA_DIR, "pdf_analysis_cache.db"))
+
+
+def _create_cache_connection():
+    os.makedirs(os.path.dirname(PDF_ANALYSIS_CACHE_PATH), exist_ok=True)
+    connection = sqlite3.connect(PDF_ANALYSIS_CACHE_PATH, timeout=30)
+    connection.execute(
+        """
+        CREATE TABLE IF NOT EXISTS page_ranges (
+            pdfHash TEXT NOT NULL,
+            pages TEXT NOT NULL,
+            content TEXT NOT NULL,
+            createdAt TEXT NOT NULL,
+            PRIMARY KEY (pdfHash, pages)
+        )
+        """
+    )
+    return connection
+
+
+def get_cached_page_ranges(pdf_hash):
+    """
+    Returns the cached content of every analyzed page range of a PDF.
+
+    Args:
+        pdf_hash (str): The SHA-256 hash of the PDF.
+
+    Returns:
+        dict: The content of every cached page range, keyed by the range (for example "11-20").
+    """
+    connection = _create_cache_connection()
+    rows = connection.execute("SELECT pages, content FROM page_ranges WHERE pdfHash = ?", (pdf_hash,)).fetchall()
+    connection.close()
+    return dict(rows)
+
+
+def store_page_range(pdf_hash, pages, content):
+    """
+    Caches the content of an analyzed page range.
+
+    Args:
+        pdf_hash (str): The SHA-256 hash of the PDF.
+        pages (str): The page range, for example "11-20".
+        content (str): The text extracted from the pages.
+
+    Returns:
+        None
+    """
+    connection = _create_cache_connection()
+    with connection:
+        connection.execute(
+            "INSERT OR REPLACE INTO page_ranges (pdfHash, pages, content, createdAt) VALUES (?, ?, ?, ?)",
+            (pdf_hash, pages, content, pd.Timestamp.now().strftime('%Y-%m-%d %H:%M:%S')),
+        )
+    connection.close()
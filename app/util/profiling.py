@@ -0,0 +1,213 @@
+"""
+On-demand sampling profiler for Streamlit reruns and the build script.
+
+Profiling is switched on with the `PROFILE` environment variable (PROFILE=1), or for a single Streamlit rerun
+with the `?profile=1` query parameter. While it is on, a background thread samples the stack of the profiled
+thread every `PROFILE_INTERVAL` seconds (default: 0.005). When the run ends, two files are written to
+`PROFILE_DIR` (default: `/app/data/profiles/`):
+- `<name>-<timestamp>.collapsed`: the sampled stacks in the collapsed format of flamegraph.pl, which can also
+  be opened in https://www.speedscope.app
+- `<name>-<timestamp>.txt`: the functions with the most samples, and the import time of the heavy modules
+  (measured once per process, in a fresh interpreter)
+
+When profiling is off, `start_profiling` returns None and nothing else runs.
+"""
+
+import os
+import re
+import sys
+import time
+import threading
+import subprocess
+from collections import Counter
+
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(DATA_DIR, "profiles"))
+
+# Modules whose import time is recorded in the summary
+HEAVY_MODULES = [
+    "pandas",
+    "numpy",
+    "pyarrow",
+    "openpyxl",
+    "requests",
+    "streamlit",
+    "azure.storage.blob",
+    "azure.search.documents",
+]
+
+_import_times = {}
+
+
+def profiling_enabled(requested=False):
+    """
+    Checks whether profiling is switched on.
+
+    Args:
+        requested (bool): Whether profiling was requested for this run, for example with the `?profile=1` query parameter.
+
+    Returns:
+        bool: True if profiling is on.
+    """
+    return requested or os.getenv("PROFILE", "").lower() in ("1", "true", "yes")
+
+
+class SamplingProfiler:
+    """Samples the stack of a thread at a fixed interval, from a background thread."""
+
+    def __init__(self, name, interval=None, thread_id=None):
+        self.name = name
+        self.interval = interval or float(os.getenv("PROFILE_INTERVAL") or 0.005)
+        self.thread_id = thread_id or threading.get_ident()
+        self.stacks = Counter()
+        self.started_at = None
+        self.duration = None
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._sample, name=f"profiler-{name}", daemon=True)
+
+    def _sample(self):
+        own_file = os.path.abspath(__file__)
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                if os.path.abspath(code.co_filename) != own_file:
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ","))
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop_event.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self.started_at
+        return self
+
+    def top_functions(self, top_n=25):
+        """
+        Returns the functions with the most samples.
+
+        Args:
+            top_n (int): The number of functions to return.
+
+        Returns:
+            tuple: The functions with the most samples of their own (self), and the functions with the most samples
+                   including the functions they call (cumulative), as lists of (function, samples) tuples.
+        """
+        self_samples = Counter()
+        cumulative_samples = Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")
+            self_samples[frames[-1]] += count
+            for frame in set(frames):
+                cumulative_samples[frame] += count
+        return self_samples.most_common(top_n), cumulative_samples.most_common(top_n)
+
+
+def measure_import_times(modules=None):
+    """
+    Measures the import time of modules in a fresh interpreter, with `python -X importtime`.
+    The result is cached, so the interpreter is only started once per process.
+
+    Args:
+        modules (list): The modules to import. Defaults to HEAVY_MODULES.
+
+    Returns:
+        dict: The cumulative import time of every module that could be imported, in seconds.
+    """
+    modules = tuple(modules or HEAVY_MODULES)
+    if modules in _import_times:
+        return _import_times[modules]
+
+    import_statements = "\n".join(f"try:\n    import {module}\nexcept ImportError:\n    pass" for module in modules)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", import_statements],
+        capture_output=True,
+        text=True,
+    )
+
+    # Every line looks like: "import time:       123 |       4567 |   package.module"
+    import_times = {}
+    for line in result.stderr.splitlines():
+        match = re.match(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|\s+(\S+)", line)
+        if match and match.group(3) in modules:
+            import_times[match.group(3)] = int(match.group(2)) / 1_000_000
+    _import_times[modules] = import_times
+    return import_times
+
+
+def save_profile(profiler, top_n=25):
+    """
+    Writes the sampled stacks and a summary of a stopped profiler to PROFILE_DIR.
+
+    Args:
+        profiler (SamplingProfiler): The stopped profiler.
+        top_n (int): The number of functions listed in the summary.
+
+    Returns:
+        str: The path of the summary.
+    """
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    base_path = os.path.join(PROFILE_DIR, f"{profiler.name}-{time.strftime('%Y%m%d-%H%M%S')}")
+
+    with open(f"{base_path}.collapsed", "w", encoding="utf-8") as file:
+        for stack, count in profiler.stacks.most_common():
+            file.write(f"{stack} {count}\n")
+
+    total_samples = sum(profiler.stacks.values()) or 1
+    self_top, cumulative_top = profiler.top_functions(top_n)
+    lines = [
+        f"Profile of {profiler.name}: {profiler.duration:.3f}s, {total_samples} samples every {profiler.interval * 1000:g}ms",
+        "",
+        f"Top {top_n} functions by own samples:",
+        *[f"{count:8d} {count / total_samples:7.1%}  {function}" for function, count in self_top],
+        "",
+        f"Top {top_n} functions by cumulative samples:",
+        *[f"{count:8d} {count / total_samples:7.1%}  {function}" for function, count in cumulative_top],
+        "",
+        "Import time of the heavy modules (in a fresh interpreter):",
+        *[f"{seconds:8.3f}s  {module}" for module, seconds in sorted(measure_import_times().items(), key=lambda item: -item[1])],
+    ]
+    with open(f"{base_path}.txt", "w", encoding="utf-8") as file:
+        file.write("\n".join(lines) + "\n")
+    return f"{base_path}.txt"
+
+
+def start_profiling(name, requested=False):
+    """
+    Starts profiling the current thread, if profiling is switched on.
+
+    Args:
+        name (str): The name of the profiled run, used in the file names.
+        requested (bool): Whether profiling was requested for this run, for example with the `?profile=1` query parameter.
+
+    Returns:
+        SamplingProfiler: The running profiler, or None if profiling is off.
+    """
+    if not profiling_enabled(requested):
+        return None
+    return SamplingProfiler(name).start()
+
+
+def stop_profiling(profiler):
+    """
+    Stops a profiler started by `start_profiling` and saves its output.
+
+    Args:
+        profiler (SamplingProfiler): The profiler, or None if profiling is off.
+
+    Returns:
+        str: The path of the summary, or None if profiling is off.
+    """
+    if profiler is None:
+        return None
+    summary_path = save_profile(profiler.stop())
+    print(f"Profile saved to {summary_path}")
+    return summary_path
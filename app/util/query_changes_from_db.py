@@ -0,0 +1,149 @@
+"""
+Incremental sync of the employees and projects shown in the Team Planning Platform.
+
+The triggers in `console.sql` log every change to an employee or project in the `change_log` table, with an
+increasing sequence number. Instead of re-reading the whole tables on every rerun, `sync_team_planning_data`
+keeps the DataFrames in `st.session_state` and only re-reads the rows that changed since the last sequence
+number it has seen.
+"""
+
+import pandas as pd
+import streamlit as st
+from util.create_connection_to_db import create_connection
+from util.query_employees_from_db import fetch_employees
+from util.query_projects_from_db import fetch_projects
+
+
+# The rows of every synced table that are shown in the app, and their order (see fetch_employees and fetch_projects)
+SYNCED_VIEWS = {
+    "employees": {"filter": "isAvailable = True", "order_by": ["role", "lastname"]},
+    "projects": {"filter": "isActive = True", "order_by": ["dateStarted"]},
+}
+
+# Changes are re-read for this many seconds, because a transaction that started earlier can commit
+# a lower sequence number after a higher one was already synced. Re-applying a change is harmless.
+SYNC_OVERLAP_SECONDS = 10
+
+
+def fetch_latest_sequence():
+    """
+    Fetches the sequence number of the most recent change.
+
+    Returns:
+        int: The latest sequence number (0 if nothing has changed yet), or None if an error occurs.
+    """
+    connection = create_connection()
+    if connection:
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT COALESCE(MAX(seq), 0) FROM change_log")
+                latest_seq = cursor.fetchone()[0]
+            return int(latest_seq)
+        except Exception as e:
+            st.error(f"Failed to fetch the latest change: {e}")
+        finally:
+            connection.close()
+    return None
+
+
+def fetch_changes_since(seq):
+    """
+    Fetches the changes logged after the given sequence number.
+
+    Args:
+        seq (int): The last sequence number that was synced.
+
+    Returns:
+        pd.DataFrame: The changes (seq, tableName, rowId, operation, changedAt), ordered by sequence number.
+                      If an error occurs, None is returned.
+    """
+    connection = create_connection()
+    if connection:
+        try:
+            query = """
+                SELECT seq, tableName, rowId, operation, changedAt FROM change_log
+                WHERE seq > %s OR changedAt >= NOW() - INTERVAL %s SECOND
+                ORDER BY seq ASC
+            """
+            df = pd.read_sql(query, connection, params=(seq, SYNC_OVERLAP_SECONDS))
+            connection.close()
+            return df
+        except Exception as e:
+            st.error(f"Failed to fetch changes: {e}")
+    return None
+
+
+def apply_changes(df, table_name, row_ids):
+    """
+    Applies changes to the DataFrame of a synced table by re-reading only the changed rows.
+
+    Args:
+        df (pd.DataFrame): The current rows, as returned by fetch_employees or fetch_projects.
+        table_name (str): The name of the table, a key of SYNCED_VIEWS.
+        row_ids (iterable): The IDs of the changed rows.
+
+    Returns:
+        pd.DataFrame: The updated rows, or None if an error occurs.
+    """
+    row_ids = sorted({int(row_id) for row_id in row_ids})
+    if not row_ids:
+        return df
+
+    view = SYNCED_VIEWS[table_name]
+    connection = create_connection()
+    if connection:
+        try:
+            query = f"""
+                SELECT * FROM {table_name}
+                WHERE id IN ({", ".join(["%s"] * len(row_ids))}) AND {view["filter"]}
+            """
+            changed_rows = pd.read_sql(query, connection, params=row_ids)
+            connection.close()
+        except Exception as e:
+            st.error(f"Failed to sync {table_name}: {e}")
+            return None
+
+        # Rows that were deleted, or no longer match the filter, are not returned and are removed from the view
+        unchanged_rows = df[~df["id"].isin(row_ids)] if not df.empty else df
+        updated = pd.concat([unchanged_rows, changed_rows], ignore_index=True) if not unchanged_rows.empty else changed_rows
+        return updated.sort_values(view["order_by"], kind="stable").reset_index(drop=True)
+    return None
+
+
+def sync_team_planning_data():
+    """
+    Returns the available employees and active projects. The first call per session reads both tables,
+    later calls only apply the changes logged since the previous call.
+
+    Returns:
+        tuple: The employees and projects DataFrames. A DataFrame is empty if it could not be read.
+    """
+    state = st.session_state.get("team_planning_sync")
+
+    if state is None:
+        # Read the sequence number before the tables, so changes made in between are applied on the next sync
+        last_seq = fetch_latest_sequence()
+        employees, projects = fetch_employees(), fetch_projects()
+        # Only keep the state if every read succeeded, otherwise read everything again on the next rerun
+        if last_seq is not None and employees is not None and projects is not None:
+            st.session_state.team_planning_sync = {"last_seq": last_seq, "employees": employees, "projects": projects}
+        return (
+            employees if employees is not None else pd.DataFrame(),
+            projects if projects is not None else pd.DataFrame(),
+        )
+
+    changes = fetch_changes_since(state["last_seq"])
+    if changes is None or changes.empty:
+        return state["employees"], state["projects"]
+
+    for table_name in SYNCED_VIEWS:
+        row_ids = changes.loc[changes["tableName"] == table_name, "rowId"]
+        updated = apply_changes(state[table_name], table_name, row_ids)
+        if updated is None:
+            # Start over with a full read on the next rerun
+            st.session_state.pop("team_planning_sync", None)
+            return state["employees"], state["projects"]
+        state[table_name] = updated
+
+    state["last_seq"] = max(state["last_seq"], int(changes["seq"].max()))
+    return state["employees"], state["projects"]
@@ -7,8 +7,8 @@ def fetch_employees():
     Fetches a list of available employees from the database.
 
     Returns:
-        pd.DataFrame: A DataFrame containing the list of available employees, ordered by role and last name. 
-                      If an error occurs, an empty DataFrame is returned.
+        pd.DataFrame: A DataFrame containing the list of available employees, ordered by role and last name,
+                      or None if an error occurs.
     """
     connection = create_connection()
     if connection:
@@ -19,4 +19,4 @@ def fetch_employees():
             return df
         except Exception as e:
             st.error(f"Failed to fetch employees: {e}")
-    return pd.DataFrame()
+    return None
@@ -7,7 +7,7 @@ def fetch_projects():
     Fetches active projects from the database.
 
     Returns:
-        pd.DataFrame: A DataFrame containing the active projects, or an empty DataFrame if an error occurs.
+        pd.DataFrame: A DataFrame containing the active projects, or None if an error occurs.
     """
     connection = create_connection()
     if connection:
@@ -18,7 +18,7 @@ def fetch_projects():
             return df
         except Exception as e:
             st.error(f"Failed to fetch projects: {e}")
-    return pd.DataFrame()
+    return None
 
 def assign_project(employee_id, project_id):
     """
@@ -68,9 +68,82 @@ def add_project(project_title):
         finally:
             connection.close()
 
+def close_projects(project_ids, connection=None):
+    """
+    Closes projects in one set-based transaction: their assignments are moved to the archive table,
+    the employees that are no longer assigned to any project become available again,
+    and the projects are marked as inactive.
+
+    The per-row work of the `after_project_update` and `after_project_assignment_delete` triggers
+    is skipped while this runs (through the `@bulk_close` session variable), because it is done here in one statement each.
+
+    Args:
+        project_ids (list): The IDs of the projects to close.
+        connection (pymysql.connections.Connection): The connection to use. A new one is opened (and closed) if not given.
+
+    Returns:
+        int: The number of projects that were closed, or None if an error occurs.
+    """
+    project_ids = sorted({int(project_id) for project_id in project_ids})
+    if not project_ids:
+        return 0
+
+    owns_connection = connection is None
+    connection = connection or create_connection()
+    if connection:
+        placeholders = ", ".join(["%s"] * len(project_ids))
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SET @bulk_close = 1")
+                cursor.execute(
+                    f"""
+                    INSERT INTO project_assignments_archive (assignmentId, projectId, employeeId, assignedDate)
+                    SELECT id, projectId, employeeId, assignedDate FROM project_assignments
+                    WHERE projectId IN ({placeholders})
+                    """,
+                    project_ids,
+                )
+                cursor.execute(f"DELETE FROM project_assignments WHERE projectId IN ({placeholders})", project_ids)
+
+                # Free the employees of the closed projects that are not assigned to any other project
+                freed_employees = f"""
+                    SELECT DISTINCT archived.employeeId FROM project_assignments_archive archived
+                    LEFT JOIN project_assignments remaining ON remaining.employeeId = archived.employeeId
+                    WHERE archived.projectId IN ({placeholders}) AND remaining.id IS NULL
+                """
+                cursor.execute(
+                    f"""
+                    UPDATE employees JOIN ({freed_employees}) freed ON freed.employeeId = employees.id
+                    SET employees.isAvailable = TRUE
+                    """,
+                    project_ids,
+                )
+
+                closed = cursor.execute(
+                    f"UPDATE projects SET isActive = False WHERE id IN ({placeholders}) AND isActive = True",
+                    project_ids,
+                )
+            connection.commit()
+            return closed
+        except Exception as e:
+            connection.rollback()
+            st.error(f"Failed to close projects: {e}")
+        finally:
+            # Session variables are not rolled back, so always re-enable the per-row triggers on this connection
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute("SET @bulk_close = NULL")
+            except Exception as e:
+                st.error(f"Failed to reset @bulk_close, closing the connection: {e}")
+                connection.close()
+            else:
+                if owns_connection:
+                    connection.close()
+    return None
+
 def delete_project(project_title):
     """
-    Marks a project as inactive in the database.
+    Marks the projects with the given title as inactive in the database.
 
     Args:
         project_title (str): The title of the project to be marked as inactive.
@@ -82,11 +155,13 @@ def delete_project(project_title):
     if connection:
         try:
             with connection.cursor() as cursor:
-                query = "UPDATE projects SET isActive = False WHERE projectTitle = %s"
-                cursor.execute(query, (project_title,))
-                connection.commit()
-            st.success("Project closed successfully!")
+                cursor.execute("SELECT id FROM projects WHERE projectTitle = %s AND isActive = True", (project_title,))
+                project_ids = [row[0] for row in cursor.fetchall()]
+            if close_projects(project_ids, connection) is not None:
+                st.success("Project closed successfully!")
         except Exception as e:
             st.error(f"Failed to close project: {e}")
         finally:
-            connection.close()
\ No newline at end of file
+            # close_projects closes the connection itself if it could not reset @bulk_close
+            if connection.open:
+                connection.close()
\ No newline at end of file
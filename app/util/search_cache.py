@@ -0,0 +1,128 @@
+"""
+Cache of Azure AI Search results, stamped with the index version published by `build_knowledge_base.py`.
+
+Results are only reused while the index version is unchanged, so no TTL is needed: a rebuild invalidates every
+cached result at once. Nothing is cached as long as no index version has been published.
+"""
+
+import os
+import re
+import json
+import sqlite3
+import hashlib
+import pandas as pd
+
+from util.index_state import get_index_version
+
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+SEARCH_CACHE_PATH = os.getenv("SEARCH_CACHE_PATH", os.path.join(DATA_DIR, "search_cache.db"))
+
+
+def normalize_query(query):
+    """
+    Normalizes a search query, so queries that only differ in case, punctuation or whitespace share a cache entry.
+
+    Args:
+        query (str): The search query.
+
+    Returns:
+        str: The normalized query.
+    """
+    return " ".join(re.findall(r"\w+", query.lower()))
+
+
+def make_cache_key(query, top, filters=None):
+    """
+    Builds the cache key of a search.
+
+    Args:
+        query (str): The search query.
+        top (int): The number of results.
+        filters (str): The OData filter of the search, if any.
+
+    Returns:
+        str: The cache key.
+    """
+    key = json.dumps([normalize_query(query), top, filters or ""])
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def _create_cache_connection():
+    os.makedirs(os.path.dirname(SEARCH_CACHE_PATH), exist_ok=True)
+    connection = sqlite3.connect(SEARCH_CACHE_PATH)
+    connection.execute(
+        """
+        CREATE TABLE IF NOT EXISTS search_results (
+            cacheKey TEXT PRIMARY KEY,
+            indexVersion TEXT NOT NULL,
+            results TEXT NOT NULL,
+            createdAt TEXT NOT NULL
+        )
+        """
+    )
+    return connection
+
+
+def get_cached_results(query, top, filters=None):
+    """
+    Returns the cached results of a search, if the index has not been rebuilt since they were cached.
+
+    Args:
+        query (str): The search query.
+        top (int): The number of results.
+        filters (str): The OData filter of the search, if any.
+
+    Returns:
+        list: The cached search results, or None if there are none for the current index version.
+    """
+    index_version = get_index_version()
+    if index_version is None:
+        return None
+
+    try:
+        connection = _create_cache_connection()
+        row = connection.execute(
+            "SELECT results FROM search_results WHERE cacheKey = ? AND indexVersion = ?",
+            (make_cache_key(query, top, filters), index_version),
+        ).fetchone()
+        connection.close()
+        return json.loads(row[0]) if row else None
+    except sqlite3.Error as e:
+        print(f"Failed to read the search cache: {e}")
+        return None
+
+
+def store_results(query, top, results, filters=None):
+    """
+    Caches the results of a search for the current index version, and removes results of older index versions.
+
+    Args:
+        query (str): The search query.
+        top (int): The number of results.
+        results (list): The search results.
+        filters (str): The OData filter of the search, if any.
+
+    Returns:
+        None
+    """
+    index_version = get_index_version()
+    if index_version is None:
+        return
+
+    try:
+        connection = _create_cache_connection()
+        with connection:
+            connection.execute("DELETE FROM search_results WHERE indexVersion != ?", (index_version,))
+            connection.execute(
+                "INSERT OR REPLACE INTO search_results (cacheKey, indexVersion, results, createdAt) VALUES (?, ?, ?, ?)",
+                (
+                    make_cache_key(query, top, filters),
+                    index_version,
+                    json.dumps(results),
+                    pd.Timestamp.now().strftime('%Y-%m-%d %H:%M:%S'),
+                ),
+            )
+        connection.close()
+    except sqlite3.Error as e:
+        print(f"Failed to write the search cache: {e}")
@@ -0,0 +1,178 @@
+"""
+Near-duplicate compaction of the knowledge-base tasks, with MinHash and locality-sensitive hashing (LSH).
+
+The knowledge base merges many historical estimations, so the same task appears many times with small wording
+changes. `compact_near_duplicates` clusters tasks of the same Profile whose Feature and Task text are near-duplicates,
+and collapses every cluster into one canonical task with aggregated day statistics and an occurrence count.
+
+How it works:
+1. Every task's "Feature | Task" text is split into overlapping character shingles.
+2. A MinHash signature of `NUM_PERMUTATIONS` values estimates the Jaccard similarity between the shingle sets.
+3. The signatures are split into `LSH_BANDS` bands. Tasks that share a band are candidate duplicates, so only
+   candidates are compared instead of every pair of tasks.
+4. Candidates whose estimated similarity is at least the threshold are merged into one cluster.
+"""
+
+import re
+import zlib
+import numpy as np
+import pandas as pd
+
+
+NUM_PERMUTATIONS = 128
+LSH_BANDS = 32
+SHINGLE_SIZE = 4
+SIMILARITY_THRESHOLD = 0.8
+
+# A Mersenne prime below 2**32, so (a * x + b) stays within 64 bits
+_PRIME = (1 << 31) - 1
+
+
+def normalize_task_text(feature, task):
+    """
+    Builds the normalized text that is compared between tasks.
+
+    Args:
+        feature (str): The Feature of the task.
+        task (str): The Task description.
+
+    Returns:
+        str: The lowercased Feature and Task, without punctuation and repeated whitespace.
+    """
+    text = f"{feature} | {task}".lower()
+    return re.sub(r"\s+", " ", re.sub(r"[^\w|]+", " ", text)).strip()
+
+
+def shingle_hashes(text, shingle_size=SHINGLE_SIZE):
+    """
+    Hashes the overlapping character shingles of a text.
+
+    Args:
+        text (str): The normalized text.
+        shingle_size (int): The number of characters per shingle.
+
+    Returns:
+        np.ndarray: The unique shingle hashes.
+    """
+    text = text if len(text) >= shingle_size else text.ljust(shingle_size)
+    shingles = {text[start:start + shingle_size] for start in range(len(text) - shingle_size + 1)}
+    return np.array([zlib.crc32(shingle.encode("utf-8")) % _PRIME for shingle in shingles], dtype=np.uint64)
+
+
+def minhash_signatures(texts, num_permutations=NUM_PERMUTATIONS, seed=1):
+    """
+    Computes the MinHash signature of every text.
+
+    Args:
+        texts (list): The normalized texts.
+        num_permutations (int): The number of hash functions, and the length of every signature.
+        seed (int): The seed of the hash functions, so signatures are the same in every build.
+
+    Returns:
+        np.ndarray: A (len(texts), num_permutations) array of signatures.
+    """
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, _PRIME, size=num_permutations, dtype=np.uint64)[:, None]
+    b = rng.integers(0, _PRIME, size=num_permutations, dtype=np.uint64)[:, None]
+
+    signatures = np.empty((len(texts), num_permutations), dtype=np.uint64)
+    for row, text in enumerate(texts):
+        hashes = shingle_hashes(text)[None, :]
+        signatures[row] = ((a * hashes + b) % _PRIME).min(axis=1)
+    return signatures
+
+
+def cluster_near_duplicates(texts, groups=None, threshold=SIMILARITY_THRESHOLD, bands=LSH_BANDS,
+                            num_permutations=NUM_PERMUTATIONS):
+    """
+    Clusters near-duplicate texts.
+
+    Args:
+        texts (list): The normalized texts.
+        groups (list): A group per text (for example the Profile). Texts of different groups are never clustered.
+        threshold (float): The minimum estimated Jaccard similarity of two near-duplicates.
+        bands (int): The number of LSH bands. More bands find more candidates, at the cost of more comparisons.
+        num_permutations (int): The length of the MinHash signatures. Must be divisible by `bands`.
+
+    Returns:
+        np.ndarray: The cluster label of every text. Texts in the same cluster have the same label.
+    """
+    groups = list(groups) if groups is not None else [""] * len(texts)
+
+    # Identical texts are clustered directly, only the unique texts are hashed
+    unique_keys = list(dict.fromkeys(zip(groups, texts)))
+    key_positions = {key: position for position, key in enumerate(unique_keys)}
+    signatures = minhash_signatures([text for _, text in unique_keys], num_permutations)
+
+    parents = np.arange(len(unique_keys))
+
+    def find(position):
+        while parents[position] != position:
+            parents[position] = parents[parents[position]]
+            position = parents[position]
+        return position
+
+    rows_per_band = num_permutations // bands
+    for band in range(bands):
+        buckets = {}
+        band_signatures = signatures[:, band * rows_per_band:(band + 1) * rows_per_band]
+        for position, (group, _) in enumerate(unique_keys):
+            buckets.setdefault((group, band_signatures[position].tobytes()), []).append(position)
+
+        for candidates in buckets.values():
+            for index, first in enumerate(candidates):
+                for second in candidates[index + 1:]:
+                    first_root, second_root = find(first), find(second)
+                    if first_root == second_root:
+                        continue
+                    if np.mean(signatures[first] == signatures[second]) >= threshold:
+                        parents[second_root] = first_root
+
+    unique_labels = np.array([find(position) for position in range(len(unique_keys))])
+    return np.array([unique_labels[key_positions[key]] for key in zip(groups, texts)])
+
+
+def compact_near_duplicates(tasks, threshold=SIMILARITY_THRESHOLD):
+    """
+    Collapses near-duplicate tasks of the same Profile into one canonical task per cluster.
+
+    The canonical task takes the most common wording of the cluster (and the most common MSCW, Area, Module,
+    Contingency and Potential Issues), the median MinDays, RealDays and MaxDays, and these aggregated fields:
+    - Occurrences: the number of tasks in the cluster
+    - RealDaysMean: the mean RealDays of the cluster
+    - LowestMinDays / HighestMaxDays: the lowest MinDays and highest MaxDays of the cluster
+
+    Args:
+        tasks (pd.DataFrame): The normalized tasks, as returned by `excel_to_dataframe`.
+        threshold (float): The minimum estimated Jaccard similarity of two near-duplicates.
+
+    Returns:
+        pd.DataFrame: The compacted tasks, in the order of their first occurrence.
+    """
+    if tasks.empty:
+        return tasks.assign(Occurrences=pd.Series(dtype=int), RealDaysMean=pd.Series(dtype=float),
+                            LowestMinDays=pd.Series(dtype=int), HighestMaxDays=pd.Series(dtype=int))
+
+    texts = [normalize_task_text(feature, task) for feature, task in zip(tasks["Feature"], tasks["Task"])]
+    tasks = tasks.assign(Cluster=cluster_near_duplicates(texts, tasks["Profile"], threshold))
+
+    def most_common(values):
+        return values.value_counts(sort=True).index[0]
+
+    aggregations = {column: most_common for column in tasks.columns if column not in ("Cluster",)}
+    aggregations.update({"MinDays": "median", "RealDays": "median", "MaxDays": "median", "EstimatedDays": "median",
+                         "EstimatedPrice": "median"})
+    clusters = tasks.groupby("Cluster", sort=False)
+    compacted = clusters.agg(aggregations)
+
+    for column in ["MinDays", "RealDays", "MaxDays", "EstimatedDays"]:
+        compacted[column] = compacted[column].round().astype(int)
+    # The medians are taken separately, so make sure MinDays <= RealDays <= MaxDays still holds
+    compacted["RealDays"] = compacted[["RealDays", "MinDays"]].max(axis=1)
+    compacted["MaxDays"] = compacted[["MaxDays", "RealDays"]].max(axis=1)
+
+    compacted["Occurrences"] = clusters.size().astype(int)
+    compacted["RealDaysMean"] = clusters["RealDays"].mean().round(2).astype(float)
+    compacted["LowestMinDays"] = clusters["MinDays"].min().astype(int)
+    compacted["HighestMaxDays"] = clusters["MaxDays"].max().astype(int)
+    return compacted.reset_index(drop=True)
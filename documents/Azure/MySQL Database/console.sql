@@ -1,6 +1,8 @@
 create database delawarexhowest;
 use delawarexhowest;
 
+DROP TABLE IF EXISTS change_log;
+DROP TABLE IF EXISTS project_assignments_archive;
 DROP TABLE IF EXISTS project_assignments;
 DROP TABLE IF EXISTS employees;
 DROP TABLE IF EXISTS projects;
@@ -33,6 +35,22 @@ CREATE TABLE project_assignments (
 );
 
 
+# Assignments of closed projects are moved here (see close_projects in query_projects_from_db.py),
+# so the NOT EXISTS checks in the triggers below only scan the assignments of active projects.
+# The archive has its own key: the ids of deleted assignments can be reused by project_assignments
+# (MySQL 5.7 resets AUTO_INCREMENT to MAX(id) + 1 after a restart), so assignmentId is not unique.
+CREATE TABLE project_assignments_archive (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    assignmentId INT NOT NULL,
+    projectId INT NOT NULL,
+    employeeId INT NOT NULL,
+    assignedDate DATETIME NOT NULL,
+    archivedAt DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_project_assignments_archive_project (projectId),
+    INDEX idx_project_assignments_archive_employee (employeeId)
+);
+
+
 CREATE TABLE roles_rates (
                              id INT AUTO_INCREMENT PRIMARY KEY,
                              role VARCHAR(100) NOT NULL,
@@ -40,6 +58,18 @@ CREATE TABLE roles_rates (
 );
 
 
+# Every change to an employee or project is logged here by the triggers below, so the Team Planning Platform
+# only has to re-read the rows that changed since the last sequence number it has seen (see query_changes_from_db.py)
+CREATE TABLE change_log (
+    seq BIGINT AUTO_INCREMENT PRIMARY KEY,
+    tableName VARCHAR(64) NOT NULL,
+    rowId INT NOT NULL,
+    operation VARCHAR(10) NOT NULL,
+    changedAt DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_change_log_changed_at (changedAt)
+);
+
+
 
 
 INSERT INTO projects (projectTitle, dateStarted, isActive) VALUES
@@ -272,7 +302,8 @@ CREATE TRIGGER after_project_assignment_delete
     FOR EACH ROW
 BEGIN
     -- Check if the employee is still assigned to any project
-    IF NOT EXISTS (
+    -- (skipped while close_projects runs, it frees all employees in one statement instead)
+    IF @bulk_close IS NULL AND NOT EXISTS (
         SELECT 1
         FROM project_assignments
         WHERE employeeId = OLD.employeeId
@@ -328,7 +359,8 @@ CREATE TRIGGER after_project_update
     FOR EACH ROW
 BEGIN
     -- Check if the project is deactivated (set isActive to FALSE)
-    IF OLD.isActive = TRUE AND NEW.isActive = FALSE THEN
+    -- (skipped while close_projects runs, it frees all employees in one statement instead)
+    IF @bulk_close IS NULL AND OLD.isActive = TRUE AND NEW.isActive = FALSE THEN
         -- Mark all employees assigned to this project as available
     UPDATE employees
     SET isAvailable = TRUE
@@ -338,6 +370,63 @@ BEGIN
         WHERE projectId = NEW.id
     );
 END IF;
+
+    INSERT INTO change_log (tableName, rowId, operation) VALUES ('projects', NEW.id, 'UPDATE');
+END;
+//
+DELIMITER ;
+
+
+
+DELIMITER //
+DROP TRIGGER IF EXISTS after_project_insert;
+CREATE TRIGGER after_project_insert
+    AFTER INSERT ON projects
+    FOR EACH ROW
+BEGIN
+    INSERT INTO change_log (tableName, rowId, operation) VALUES ('projects', NEW.id, 'INSERT');
+END;
+//
+DELIMITER ;
+
+
+
+# Log every change to an employee, including changes made outside the app and by the assignment triggers above
+# (a trigger that updates employees fires these triggers as well)
+
+DELIMITER //
+DROP TRIGGER IF EXISTS after_employee_insert;
+CREATE TRIGGER after_employee_insert
+    AFTER INSERT ON employees
+    FOR EACH ROW
+BEGIN
+    INSERT INTO change_log (tableName, rowId, operation) VALUES ('employees', NEW.id, 'INSERT');
+END;
+//
+DELIMITER ;
+
+
+
+DELIMITER //
+DROP TRIGGER IF EXISTS after_employee_update;
+CREATE TRIGGER after_employee_update
+    AFTER UPDATE ON employees
+    FOR EACH ROW
+BEGIN
+    INSERT INTO change_log (tableName, rowId, operation) VALUES ('employees', NEW.id, 'UPDATE');
+END;
+//
+DELIMITER ;
+
+
+
+DELIMITER //
+DROP TRIGGER IF EXISTS after_employee_delete;
+CREATE TRIGGER after_employee_delete
+    AFTER DELETE ON employees
+    FOR EACH ROW
+BEGIN
+    INSERT INTO change_log (tableName, rowId, operation) VALUES ('employees', OLD.id, 'DELETE');
 END;
 //
 DELIMITER ;
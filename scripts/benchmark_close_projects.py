@@ -0,0 +1,157 @@
+"""
+This script benchmarks closing projects one by one (the old `delete_project` behaviour) against `close_projects`,
+which closes them in one set-based transaction.
+
+It creates a large assignment history of benchmark projects ("Benchmark project ...") for the existing employees,
+closes them one at a time, and prints how long that took. It then deletes them, creates the same projects and
+assignments again, closes them in bulk and prints how long that took, so both ways do the same work.
+The benchmark projects, their assignments and their archived assignments are deleted afterwards.
+
+! This changes the availability of the employees, so only run it against a development or test database.
+! Make sure to run this script in your terminal from the `/scripts/` directory.
+
+Usage:
+    python benchmark_close_projects.py [number of projects] [assignments per project]
+"""
+
+
+import sys
+import time
+import random
+import os
+
+# Make the shared helpers in `/app/util/` importable from this script
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+from util.create_connection_to_db import create_connection
+from util.query_projects_from_db import close_projects
+
+BENCHMARK_PREFIX = "Benchmark project"
+
+
+def create_benchmark_projects(connection, project_count, assignments_per_project, seed=1):
+    """
+    Creates benchmark projects, each assigned to random employees.
+
+    Args:
+        connection (pymysql.connections.Connection): The database connection.
+        project_count (int): The number of projects to create.
+        assignments_per_project (int): The number of assignments per project.
+        seed (int): The seed of the random assignments, so every call creates the same assignments.
+
+    Returns:
+        list: The IDs of the created projects.
+    """
+    rng = random.Random(seed)
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT id FROM employees ORDER BY id")
+        employee_ids = [row[0] for row in cursor.fetchall()]
+        if not employee_ids:
+            raise ValueError("The employees table is empty.")
+
+        cursor.executemany(
+            "INSERT INTO projects (projectTitle, dateStarted, isActive) VALUES (%s, NOW(), True)",
+            [(f"{BENCHMARK_PREFIX} {number}",) for number in range(project_count)],
+        )
+        cursor.execute("SELECT id FROM projects WHERE projectTitle LIKE %s ORDER BY id", (f"{BENCHMARK_PREFIX} %",))
+        project_ids = [row[0] for row in cursor.fetchall()]
+
+        cursor.executemany(
+            "INSERT INTO project_assignments (projectId, employeeId) VALUES (%s, %s)",
+            [
+                (project_id, employee_id)
+                for project_id in project_ids
+                for employee_id in rng.choices(employee_ids, k=assignments_per_project)
+            ],
+        )
+    connection.commit()
+    return project_ids
+
+
+def close_projects_one_by_one(connection, project_ids):
+    """
+    Closes projects the way `delete_project` used to: one UPDATE per project, with the per-row trigger work.
+
+    Args:
+        connection (pymysql.connections.Connection): The database connection.
+        project_ids (list): The IDs of the projects to close.
+
+    Returns:
+        None
+    """
+    with connection.cursor() as cursor:
+        for project_id in project_ids:
+            cursor.execute("UPDATE projects SET isActive = False WHERE id = %s", (project_id,))
+            connection.commit()
+
+
+def delete_benchmark_projects(connection):
+    """
+    Deletes the benchmark projects, and their (archived) assignments.
+
+    Args:
+        connection (pymysql.connections.Connection): The database connection.
+
+    Returns:
+        None
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            DELETE archived FROM project_assignments_archive archived
+            JOIN projects ON projects.id = archived.projectId
+            WHERE projects.projectTitle LIKE %s
+            """,
+            (f"{BENCHMARK_PREFIX} %",),
+        )
+        # The assignments are deleted by the foreign key cascade
+        cursor.execute("DELETE FROM projects WHERE projectTitle LIKE %s", (f"{BENCHMARK_PREFIX} %",))
+    connection.commit()
+
+
+def run_benchmark(project_count, assignments_per_project):
+    """
+    Runs the benchmark and prints the results.
+
+    Args:
+        project_count (int): The number of benchmark projects.
+        assignments_per_project (int): The number of assignments per project.
+
+    Returns:
+        None
+    """
+    connection = create_connection()
+    if not connection:
+        return
+
+    try:
+        # Both ways start from the same, freshly created projects, so the assignments of one do not affect the other
+        delete_benchmark_projects(connection)
+        print(f"Creating {project_count} projects with {assignments_per_project} assignments each...")
+        one_by_one_ids = create_benchmark_projects(connection, project_count, assignments_per_project)
+
+        start = time.perf_counter()
+        close_projects_one_by_one(connection, one_by_one_ids)
+        one_by_one_seconds = time.perf_counter() - start
+        print(f"Closed {len(one_by_one_ids)} projects one by one in {one_by_one_seconds:.2f}s")
+
+        delete_benchmark_projects(connection)
+        print(f"Creating the same {project_count} projects again...")
+        bulk_ids = create_benchmark_projects(connection, project_count, assignments_per_project)
+
+        start = time.perf_counter()
+        close_projects(bulk_ids, connection)
+        bulk_seconds = time.perf_counter() - start
+        print(f"Closed {len(bulk_ids)} projects in bulk in {bulk_seconds:.2f}s")
+
+        if bulk_seconds > 0:
+            print(f"Speed-up: {one_by_one_seconds / bulk_seconds:.1f}x")
+    finally:
+        delete_benchmark_projects(connection)
+        connection.close()
+
+
+if __name__ == "__main__":
+    run_benchmark(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 500,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 20,
+    )
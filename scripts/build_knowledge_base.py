@@ -1,7 +1,9 @@
 """
 This script does the following tasks:
-1. It creates an AI Search index (or re-creates it if it already exists) based on a JSON configuration file.
-2. It uploads multiple Excel files from an Azure Blob Storage container to an Azure Search index in the correct format.
+1. It creates a new AI Search index based on a JSON configuration file, named after the index version of this build
+   (for example `tasks-index-excel-20250101120000-1a2b3c4d`).
+2. It uploads multiple Excel files from an Azure Blob Storage container to the new index in the correct format.
+3. It checks that the new index contains every document, and then switches the app over to it.
 
 Usage steps:
 1. Upload the files you want to use for your knowledge base to the Azure Blob Storage container, in our case 'knowledge-base'
@@ -11,21 +13,48 @@ Usage steps:
 ! You can also just move the JSON configuration file here, and update the path in the script.
 
 If everything went well, you should see the index created and the documents uploaded to the Azure Search service..
-Whenever you update the knowledge base, simply run this script again, it will re-create the index and use/upload the new data.
+Whenever you update the knowledge base, simply run this script again, it will build a new index with the new data.
+
+The app keeps searching the previous index until the new one is complete (blue/green), so a rebuild causes no downtime.
+The active index is recorded in `/app/data/index_state.json`. If the app does not share that directory with this script,
+set `AZURE_SEARCH_ALIAS_NAME`: the alias is pointed at the new index, and the app can use the alias name as its
+`AZURE_SEARCH_INDEX_NAME`. Previous indexes are deleted by a later build once they have been retired for
+`INDEX_GRACE_PERIOD_HOURS` (default: 24) hours, so searches that were still running against them can finish.
+
+The normalized contents of every Excel file are kept as a local snapshot in `/app/data/knowledge_base/`, keyed by the
+blob's etag. Only files that changed since the previous run are downloaded and parsed again.
+Before uploading, near-duplicate tasks (the same Feature and Task with small wording changes, for the same Profile) are
+collapsed into one task with aggregated day statistics and an `Occurrences` count, see `/app/util/task_dedup.py`.
+When the upload has finished, a new index version is published in `/app/data/index_state.json`. The app caches search
+results per index version, so the cached results are invalidated as soon as the knowledge base is rebuilt.
 """
 
 
 import io
+import sys
 import json
+import time
+import requests
 import pandas as pd
 from azure.search.documents import SearchClient
 from azure.search.documents.indexes import SearchIndexClient
 from azure.search.documents.indexes.models import SearchIndex
 from azure.core.credentials import AzureKeyCredential
+from azure.core.exceptions import ResourceNotFoundError
 from azure.storage.blob import BlobServiceClient
 from dotenv import load_dotenv
 import os
 
+# Make the shared helpers in `/app/util/` importable from this script
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+from util.knowledge_base_snapshot import TASK_COLUMNS, has_snapshot, read_snapshot, write_snapshot, prune_snapshots
+from util.embeddings import get_embedding_provider, embed_texts, task_embedding_text
+from util.index_state import (
+    new_index_version, publish_index_version, get_active_index_name, get_expired_indexes, forget_retired_indexes,
+)
+from util.task_dedup import compact_near_duplicates
+from util.profiling import start_profiling, stop_profiling
+
 load_dotenv()  # Ensure this is called before accessing environment variables
 
 # Load environment variables from the secrets.toml
@@ -34,6 +63,8 @@ AZURE_KNOWLEDGE_BASE_CONTAINER_NAME = os.getenv("AZURE_KNOWLEDGE_BASE_CONTAINER_
 AZURE_SEARCH_ENDPOINT = os.getenv("AZURE_SEARCH_ENDPOINT")
 AZURE_SEARCH_API_KEY = os.getenv("AZURE_SEARCH_API_KEY")
 AZURE_SEARCH_INDEX_NAME = os.getenv("AZURE_SEARCH_INDEX_NAME")
+AZURE_SEARCH_ALIAS_NAME = os.getenv("AZURE_SEARCH_ALIAS_NAME")
+INDEX_GRACE_PERIOD_HOURS = float(os.getenv("INDEX_GRACE_PERIOD_HOURS") or 24)
 
 if not AZURE_STORAGE_CONNECTION_STRING:
     raise ValueError("AZURE_STORAGE_CONNECTION_STRING is not set. Check your environment variables.")
@@ -53,7 +84,7 @@ def load_index_configuration(file_path):
         return json.load(config_file)
 
 
-def ensure_index_exists(index_client, index_name, config_path):
+def ensure_index_exists(index_client, index_name, config_path, vector_dimensions=None):
     """
     Ensure the Azure Cognitive Search index exists by creating it if necessary.
 
@@ -61,6 +92,7 @@ def ensure_index_exists(index_client, index_name, config_path):
         index_client (SearchIndexClient): The Azure Search Index client.
         index_name (str): The name of the search index.
         config_path (str): Path to the index configuration file.
+        vector_dimensions (int): The dimensions of the embedding provider, used for the vector fields.
 
     Returns:
         None
@@ -74,44 +106,102 @@ def ensure_index_exists(index_client, index_name, config_path):
 
     # Load and create the index from configuration
     index_config = load_index_configuration(config_path)
-    index = SearchIndex(**index_config)
+    index_config["name"] = index_name
+    if vector_dimensions:
+        for field in index_config["fields"]:
+            if "dimensions" in field:
+                field["dimensions"] = vector_dimensions
+    index = SearchIndex.from_dict(index_config)
     index_client.create_index(index)
     print(f"Index '{index_name}' has been created.")
 
 
-def get_next_id(client):
+def wait_for_document_count(client, expected_count, timeout=300):
     """
-    Retrieve the current highest ID from the Azure Cognitive Search index and calculate the next ID.
+    Wait until the index reports the expected number of documents. Uploaded documents are indexed asynchronously,
+    so the count can lag behind for a few seconds.
 
     Args:
-        client (SearchClient): The Azure Search client.
+        client (SearchClient): The Azure Search client of the index.
+        expected_count (int): The number of uploaded documents.
+        timeout (int): How long to wait at most, in seconds.
 
     Returns:
-        int: The next ID to use.
+        bool: True if the index contains the expected number of documents.
     """
-    highest_id = 0
-    try:
-        # Query the index to find the highest current ID
-        results = client.search(search_text="*", select="id", top=1)
-        for result in results:
-            highest_id = int(result.get("id", 0))
-            break
-    except Exception as e:
-        print(f"Error retrieving the highest ID: {e}")
+    deadline = time.time() + timeout
+    while True:
+        document_count = client.get_document_count()
+        if document_count == expected_count:
+            return True
+        if time.time() > deadline:
+            print(f"The index contains {document_count} documents instead of {expected_count}.")
+            return False
+        time.sleep(5)
+
+
+def point_alias_to_index(alias_name, index_name):
+    """
+    Point an Azure AI Search alias at an index, through the REST API (aliases are not supported by the SDK yet).
 
-    return highest_id + 1
+    Args:
+        alias_name (str): The name of the alias.
+        index_name (str): The name of the index.
 
+    Returns:
+        None
+    """
+    response = requests.put(
+        f"{AZURE_SEARCH_ENDPOINT}/aliases/{alias_name}?api-version=2024-03-01-Preview",
+        headers={"Content-Type": "application/json", "api-key": AZURE_SEARCH_API_KEY},
+        json={"name": alias_name, "indexes": [index_name]},
+    )
+    response.raise_for_status()
+    print(f"Alias '{alias_name}' now points to index '{index_name}'.")
 
-def excel_to_json(blob_data, start_id):
+
+def delete_expired_indexes(index_client, base_index_name, grace_period_hours):
     """
-    Convert Excel file data to JSON objects.
+    Delete the previous versions of the index that were retired longer than the grace period ago.
+    Indexes that were not built by this script (whose name does not start with the base index name) are never deleted.
+
+    Args:
+        index_client (SearchIndexClient): The Azure Search Index client.
+        base_index_name (str): The base name of the versioned indexes.
+        grace_period_hours (float): How long a retired index is kept, in hours.
+
+    Returns:
+        None
+    """
+    # Only forget the indexes that are gone or deliberately kept, the others are retried by the next build
+    forgotten_indexes = []
+    for index_name in get_expired_indexes(grace_period_hours):
+        if not index_name.startswith(f"{base_index_name}-"):
+            print(f"Keeping index '{index_name}', it was not built as a version of '{base_index_name}'.")
+            forgotten_indexes.append(index_name)
+            continue
+        try:
+            index_client.delete_index(index_name)
+            print(f"Deleted retired index '{index_name}'.")
+        except ResourceNotFoundError:
+            print(f"Retired index '{index_name}' was already deleted.")
+        except Exception as e:
+            print(f"Could not delete retired index '{index_name}', retrying in the next build: {e}")
+            continue
+        forgotten_indexes.append(index_name)
+    forget_retired_indexes(forgotten_indexes)
+
+
+def excel_to_dataframe(blob_data):
+    """
+    Parse Excel file data into a DataFrame of normalized tasks.
 
     Args:
         blob_data (bytes): The Excel file content as bytes.
-        start_id (int): The starting ID for the JSON objects.
 
     Returns:
-        list: A list of JSON objects formatted for the Azure Search index.
+        pd.DataFrame: The tasks, with exactly the columns of `TASK_COLUMNS` and their index types,
+                      or None if the file has no valid sheet.
     """
     
     # Wrap blob_data in BytesIO to read it as a file-like object
@@ -126,7 +216,7 @@ def excel_to_json(blob_data, start_id):
         sheet = df["Sheet1"]
     else:
         print("No valid sheet ('Tasks' or 'Sheet1') found. Skipping this file.")
-        return []
+        return None
 
     # Ensure numeric fields are cast to integers
     numeric_fields = ["MinDays", "RealDays", "MaxDays", "EstimatedDays", "EstimatedPrice"]
@@ -148,26 +238,50 @@ def excel_to_json(blob_data, start_id):
         if field in sheet.columns:
             sheet[field] = sheet[field].fillna("").astype(str)
 
+    # Keep only the indexed columns, filling in defaults for missing ones, with fixed types
+    # so every snapshot has the same schema
+    normalized = pd.DataFrame(index=sheet.index)
+    for field, default in TASK_COLUMNS.items():
+        column = sheet[field] if field in sheet.columns else pd.Series(default, index=sheet.index)
+        normalized[field] = column.astype(type(default))
+
+    return normalized.reset_index(drop=True)
 
-    # Convert DataFrame rows to JSON objects
+
+def dataframe_to_json(sheet, start_id):
+    """
+    Convert a DataFrame of normalized tasks to JSON objects.
+
+    Args:
+        sheet (pd.DataFrame): The normalized tasks, as returned by `excel_to_dataframe`.
+        start_id (int): The starting ID for the JSON objects.
+
+    Returns:
+        list: A list of JSON objects formatted for the Azure Search index.
+    """
     documents = []
     current_id = start_id
-    for _, row in sheet.iterrows():
+    for row in sheet.to_dict(orient="records"):
         document = {
             "id": str(current_id),  # ID must always be a string
-            "Task": row.get("Task", ""),
-            "MSCW": row.get("MSCW", ""),
-            "Area": row.get("Area", ""),
-            "Module": row.get("Module", ""),
-            "Feature": row.get("Feature", ""),
-            "Profile": row.get("Profile", ""),
-            "MinDays": int(row.get("MinDays", 0)),
-            "RealDays": int(row.get("RealDays", 0)),
-            "MaxDays": int(row.get("MaxDays", 0)),
-            "Contingency": row.get("Contingency", "0"),  # String field
-            "EstimatedDays": int(row.get("EstimatedDays", 0)),
-            "EstimatedPrice": float(row.get("EstimatedPrice", 0)),  # Ensure float for Edm.Double
-            "PotentialIssues": row.get("PotentialIssues", ""),
+            "Task": row["Task"],
+            "MSCW": row["MSCW"],
+            "Area": row["Area"],
+            "Module": row["Module"],
+            "Feature": row["Feature"],
+            "Profile": row["Profile"],
+            "MinDays": int(row["MinDays"]),
+            "RealDays": int(row["RealDays"]),
+            "MaxDays": int(row["MaxDays"]),
+            "Contingency": row["Contingency"],  # String field
+            "EstimatedDays": int(row["EstimatedDays"]),
+            "EstimatedPrice": float(row["EstimatedPrice"]),  # Ensure float for Edm.Double
+            "PotentialIssues": row["PotentialIssues"],
+            # Aggregated over the near-duplicates of the task, see `compact_near_duplicates`
+            "Occurrences": int(row.get("Occurrences", 1)),
+            "RealDaysMean": float(row.get("RealDaysMean", row["RealDays"])),
+            "LowestMinDays": int(row.get("LowestMinDays", row["MinDays"])),
+            "HighestMaxDays": int(row.get("HighestMaxDays", row["MaxDays"])),
         }
         documents.append(document)
         current_id += 1
@@ -175,6 +289,88 @@ def excel_to_json(blob_data, start_id):
     return documents
 
 
+def excel_to_json(blob_data, start_id):
+    """
+    Convert Excel file data to JSON objects.
+
+    Args:
+        blob_data (bytes): The Excel file content as bytes.
+        start_id (int): The starting ID for the JSON objects.
+
+    Returns:
+        list: A list of JSON objects formatted for the Azure Search index.
+    """
+    sheet = excel_to_dataframe(blob_data)
+    if sheet is None:
+        return []
+    return dataframe_to_json(sheet, start_id)
+
+
+def load_blob_tasks(container_client, blob):
+    """
+    Load the normalized tasks of an Excel blob, from its local snapshot if the blob's etag did not change,
+    or by downloading and parsing it otherwise (and refreshing the snapshot).
+
+    Args:
+        container_client (ContainerClient): The client of the knowledge-base container.
+        blob (BlobProperties): The Excel blob.
+
+    Returns:
+        pd.DataFrame: The normalized tasks, or None if the file has no valid sheet.
+    """
+    if has_snapshot(blob.name, blob.etag):
+        print(f"Using snapshot of unchanged Excel file: {blob.name}")
+        return read_snapshot(blob.name, blob.etag)
+
+    print(f"Processing Excel file: {blob.name}")
+
+    # Download the blob content
+    blob_client = container_client.get_blob_client(blob)
+    blob_data = blob_client.download_blob().readall()
+
+    # Convert Excel content to normalized tasks and snapshot them for the next build.
+    # A file without a valid sheet is recorded as well, so it is not parsed again until it changes.
+    sheet = excel_to_dataframe(blob_data)
+    write_snapshot(blob.name, blob.etag, sheet)
+    return sheet
+
+
+def add_task_vectors(documents, embedding_provider, batch_size=256):
+    """
+    Add the embedding of every task to its document, in the `TaskVector` field.
+    Embeddings are computed in batches and cached locally, so unchanged tasks are not embedded again.
+
+    Args:
+        documents (list): The documents to upload.
+        embedding_provider (object): The embedding provider.
+        batch_size (int): The number of tasks embedded per request.
+
+    Returns:
+        None
+    """
+    texts = [task_embedding_text(document) for document in documents]
+    vectors = embed_texts(texts, embedding_provider, batch_size=batch_size)
+    for document, vector in zip(documents, vectors):
+        document["TaskVector"] = vector.tolist()
+    print(f"Computed embeddings for {len(documents)} tasks with '{embedding_provider.name}'.")
+
+
+def upload_documents_in_batches(client, documents, batch_size=500):
+    """
+    Upload documents to the search index in batches, to stay below the request size limit of Azure AI Search.
+
+    Args:
+        client (SearchClient): The Azure Search client.
+        documents (list): The documents to upload.
+        batch_size (int): The number of documents per request.
+
+    Returns:
+        None
+    """
+    for start in range(0, len(documents), batch_size):
+        client.upload_documents(documents[start:start + batch_size])
+
+
 def upload_tasks_from_blob_storage():
     """
     Upload tasks from Excel files in an Azure Blob Storage container to Azure Cognitive Search.
@@ -192,46 +388,92 @@ def upload_tasks_from_blob_storage():
         credential=AzureKeyCredential(AZURE_SEARCH_API_KEY)
     )
 
-    # Create a SearchClient for Azure Cognitive Search
-    client = SearchClient(
-        endpoint=AZURE_SEARCH_ENDPOINT,
-        index_name=AZURE_SEARCH_INDEX_NAME,
-        credential=AzureKeyCredential(AZURE_SEARCH_API_KEY)
-    )
-    
-    # Ensure the search index exists
-    config_path = r"../documents/Azure/AI Search/search_index_configuration.json"
-    ensure_index_exists(index_client, AZURE_SEARCH_INDEX_NAME, config_path)
-    
-    # Get the starting ID
-    next_id = get_next_id(client)
-
     # List and process all Excel blobs in the container
-    all_documents = []  # Combine documents from all Excel files
+    sheets = []  # Combine the tasks from all Excel files
+    excel_blob_names = []
     for blob in container_client.list_blobs():
         if blob.name.endswith(".xlsx"):  # Process only Excel files
-            print(f"Processing Excel file: {blob.name}")
+            excel_blob_names.append(blob.name)
+
+            # Convert Excel content to normalized tasks
+            sheet = load_blob_tasks(container_client, blob)
+            if sheet is not None:
+                sheets.append(sheet)
+
+    # Forget the snapshots of files that were removed from the container
+    prune_snapshots(excel_blob_names)
+
+    # Collapse near-duplicate tasks into one document each, and convert the tasks to JSON objects.
+    # Every build fills a new, empty index, so the IDs start at 1.
+    all_documents = []
+    if sheets:
+        tasks = pd.concat(sheets, ignore_index=True)
+        compacted = compact_near_duplicates(tasks)
+        print(f"Compacted {len(tasks)} tasks into {len(compacted)} tasks without near-duplicates.")
+        all_documents = dataframe_to_json(compacted, 1)
+
+    if not all_documents:
+        print("No Excel files found or no data to upload.")
+        return
 
-            # Download the blob content
-            blob_client = container_client.get_blob_client(blob)
-            blob_data = blob_client.download_blob().readall()
+    embedding_provider = get_embedding_provider()
+    add_task_vectors(all_documents, embedding_provider)
 
-            # Convert Excel content to JSON objects
-            documents = excel_to_json(blob_data, next_id)
-            all_documents.extend(documents)
+    # Only create the index once the documents are built, so a failing build leaves no orphaned index behind.
+    # The new index is named after this build's version, the app keeps using the active index meanwhile.
+    index_version = new_index_version()
+    index_name = f"{AZURE_SEARCH_INDEX_NAME}-{index_version}".lower()
+    config_path = r"../documents/Azure/AI Search/search_index_configuration.json"
+    ensure_index_exists(index_client, index_name, config_path, embedding_provider.dimensions)
 
-            # Increment the ID for the next file's data
-            next_id += len(documents)
+    # Create a SearchClient for Azure Cognitive Search
+    client = SearchClient(
+        endpoint=AZURE_SEARCH_ENDPOINT,
+        index_name=index_name,
+        credential=AzureKeyCredential(AZURE_SEARCH_API_KEY)
+    )
 
-    # Upload all documents to the search index
-    if all_documents:
-        result = client.upload_documents(all_documents)
-        print(f"Successfully uploaded {len(all_documents)} documents to the search index.")
-    else:
-        print("No Excel files found or no data to upload.")
+    # Upload all documents to the new search index, and delete it if that fails
+    try:
+        upload_documents_in_batches(client, all_documents)
+        index_complete = wait_for_document_count(client, len(all_documents))
+    except Exception:
+        index_client.delete_index(index_name)
+        raise
+    if not index_complete:
+        print(f"Deleting the incomplete index '{index_name}'. The app keeps using the active index.")
+        index_client.delete_index(index_name)
+        return
+    print(f"Successfully uploaded {len(all_documents)} documents to the search index '{index_name}'.")
+
+    # Switch the app over to the new index, and invalidate its cached search results.
+    # If that fails, the new index is deleted (and the alias pointed back), so it is not left behind unrecorded.
+    previous_index_name = get_active_index_name()
+    alias_switched = False
+    try:
+        if AZURE_SEARCH_ALIAS_NAME:
+            point_alias_to_index(AZURE_SEARCH_ALIAS_NAME, index_name)
+            alias_switched = True
+        publish_index_version(index_name, len(all_documents), index_version)
+    except Exception:
+        if alias_switched and previous_index_name:
+            try:
+                point_alias_to_index(AZURE_SEARCH_ALIAS_NAME, previous_index_name)
+            except Exception as e:
+                print(f"Could not point alias '{AZURE_SEARCH_ALIAS_NAME}' back to '{previous_index_name}': {e}")
+        index_client.delete_index(index_name)
+        raise
+    print(f"Published index version '{index_version}'.")
+
+    delete_expired_indexes(index_client, AZURE_SEARCH_INDEX_NAME.lower(), INDEX_GRACE_PERIOD_HOURS)
 
     print("All Excel files have been processed and uploaded.")
 
 
 # Execute the upload
-upload_tasks_from_blob_storage()
+# Set PROFILE=1 to profile the whole build, see app/util/profiling.py
+profiler = start_profiling("build_knowledge_base")
+try:
+    upload_tasks_from_blob_storage()
+finally:
+    stop_profiling(profiler)